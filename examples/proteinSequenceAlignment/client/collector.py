@@ -0,0 +1,110 @@
+"""
+Contains the collector which gathers the completion messages of a Job's tasks.
+Several receiver threads long-poll the completion queue and hand every message to the Job as soon as it arrives;
+messages are acknowledged (deleted from the queue) in batches.
+"""
+import queue
+import threading
+
+class CompletionCollector:
+    """
+    Receives completion messages from a backend with several long-polling threads and acknowledges them in batches.
+
+    Attributes:
+        backend: The backend of the Job (see lambda_client.AwsBackend).
+        queueUrl: The url of the completion queue.
+        receivers: Number of threads polling the queue in parallel.
+        waitSeconds: Long polling wait time of each receive call (0 - 20 seconds).
+        ackBatchSize: Number of acknowledgements sent together (at most 10 for SQS).
+    """
+    def __init__(self, backend, queueUrl, receivers=1, waitSeconds=20, ackBatchSize=10):
+        self.backend = backend
+        self.queueUrl = queueUrl
+        self.receivers = receivers
+        self.waitSeconds = waitSeconds
+        self.ackBatchSize = ackBatchSize
+        self.__messages = queue.Queue()
+        self.__pendingAcks = []
+        self.__ackLock = threading.Lock()
+        self.__receiveLock = threading.Lock() # Taken while received messages are queued, so that stop() sees all of them
+        self.__stopping = threading.Event()
+        self.__threads = []
+
+    def start(self):
+        """
+        Starts the receiver threads.
+        """
+        for i in range(0, self.receivers):
+            t = threading.Thread(target=self.__receiverWorker, daemon=True)
+            t.start()
+            self.__threads.append(t)
+
+    def __receiverWorker(self):
+        while not self.__stopping.is_set():
+            try:
+                messages = self.backend.receiveCompletions(self.queueUrl, self.waitSeconds)
+            except Exception as e:
+                print("Receiving completion messages failed:", repr(e))
+                self.__stopping.wait(1)
+                continue
+            with self.__receiveLock:
+                if not self.__stopping.is_set():
+                    for msg in messages:
+                        self.__messages.put(msg)
+                    continue
+            # The Job is no longer collecting; put the messages back for whoever reads the queue next.
+            self.__release([msg["ReceiptHandle"] for msg in messages])
+            break
+
+    def __release(self, receiptHandles):
+        for i in range(0, len(receiptHandles), self.ackBatchSize):
+            self.backend.releaseCompletions(self.queueUrl, receiptHandles[i:i + self.ackBatchSize])
+
+    def getMessage(self, timeout):
+        """
+        Returns the next received message, or None if no message arrived within timeout seconds.
+        """
+        try:
+            return self.__messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def acknowledge(self, receiptHandle):
+        """
+        Marks a message as processed. Acknowledgements are sent once ackBatchSize of them are pending (or on flush).
+        """
+        with self.__ackLock:
+            self.__pendingAcks.append(receiptHandle)
+            if len(self.__pendingAcks) < self.ackBatchSize:
+                return
+            receiptHandles = self.__pendingAcks
+            self.__pendingAcks = []
+        self.backend.deleteCompletions(self.queueUrl, receiptHandles)
+
+    def flush(self):
+        """
+        Sends all pending acknowledgements.
+        """
+        with self.__ackLock:
+            receiptHandles = self.__pendingAcks
+            self.__pendingAcks = []
+        for i in range(0, len(receiptHandles), self.ackBatchSize):
+            self.backend.deleteCompletions(self.queueUrl, receiptHandles[i:i + self.ackBatchSize])
+
+    def stop(self):
+        """
+        Stops the receivers and sends all pending acknowledgements. Received messages which were not taken with getMessage
+        are released back to the queue (made visible again) instead of reappearing only after their visibility timeout.
+        Receivers still inside a long poll exit once it returns, releasing anything they received back to the queue as well.
+        """
+        with self.__receiveLock:
+            self.__stopping.set()
+        self.__threads = []
+        self.flush()
+        receiptHandles = []
+        while True:
+            try:
+                receiptHandles.append(self.__messages.get_nowait()["ReceiptHandle"])
+            except queue.Empty:
+                break
+        self.__release(receiptHandles)
@@ -0,0 +1,129 @@
+"""
+Contains the invoker which launches AWS Lambda functions for a Job.
+All invocations share one boto3 client (and its connection pool) and are issued by a fixed number of worker threads,
+so launching thousands of tasks costs neither a client nor a thread per task.
+"""
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+
+# Returns whether the invocation error is Lambda throttling the invocation (TooManyRequestsException, HTTP 429).
+def isThrottle(error):
+    if not isinstance(error, ClientError):
+        return False
+    return (error.response.get("Error", {}).get("Code") == "TooManyRequestsException" or
+            error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 429)
+
+# Returns whether the invocation error is transient (a network error or a 5xx response), so repeating the call may succeed.
+def isTransient(error):
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+        return True
+    return isinstance(error, ClientError) and error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+
+class InvokeStats:
+    """
+    Thread-safe measurements of invocations: how many were issued, how long each call took and the resulting invoke rate.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__latencies = [] # Duration (ms) of each successful invocation call
+        self.__failures = 0
+        self.__firstStart = None
+        self.__lastEnd = None
+
+    def record(self, startTime, endTime, succeeded):
+        """
+        Records one invocation call which started at startTime and returned at endTime (seconds, time.time()).
+        """
+        with self.__lock:
+            if self.__firstStart is None or startTime < self.__firstStart:
+                self.__firstStart = startTime
+            if self.__lastEnd is None or endTime > self.__lastEnd:
+                self.__lastEnd = endTime
+            if succeeded:
+                self.__latencies.append((endTime - startTime) * 1000)
+            else:
+                self.__failures += 1
+
+    def getStats(self):
+        """
+        Returns a dict with the number of invocations and failures, the invoke rate (invocations/s) and
+        the mean, median, 99th percentile and max latency (ms) of the invocation calls.
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            failures = self.__failures
+            elapsed = (self.__lastEnd - self.__firstStart) if self.__firstStart is not None else 0
+        count = len(latencies)
+        return {
+            "invocations": count,
+            "failures": failures,
+            "invokeRate": count / elapsed if elapsed > 0 else 0,
+            "meanLatencyMs": sum(latencies) / count if count else 0,
+            "medianLatencyMs": latencies[count // 2] if count else 0,
+            "p99LatencyMs": latencies[min(count - 1, int(count * 0.99))] if count else 0,
+            "maxLatencyMs": latencies[-1] if count else 0
+        }
+
+class Invoker:
+    """
+    Launches AWS Lambda functions asynchronously from a fixed-size pool of worker threads sharing one client.
+
+    Attributes:
+        workers: Number of threads issuing invocations. This is also the size of the client's connection pool.
+        stats: InvokeStats of all invocations issued so far.
+        transientAttempts: Number of calls made for an invocation which fails with a transient error (see isTransient), with
+            exponential backoff (full jitter) between the calls, like botocore's standard retries.
+    """
+    def __init__(self, workers=64, transientAttempts=3):
+        self.workers = workers
+        self.stats = InvokeStats()
+        self.transientAttempts = transientAttempts
+        # botocore's own retries are disabled since they would also retry throttles, which have to reach the Job (see invoke's
+        # onFailed) to lower its concurrency. Transient errors are retried here instead.
+        self.__lambdaClient = boto3.client("lambda", config=Config(max_pool_connections=workers, retries={"mode": "standard", "total_max_attempts": 1}))
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+
+    def invoke(self, functionName, event, onFailed=None):
+        """
+        Queues an asynchronous invocation of functionName with the given event. Returns immediately.
+        If the invocation is rejected, onFailed(error, throttled) is called from a worker thread;
+        throttled tells whether Lambda rejected it because of throttling (see isThrottle). Transient errors are only reported
+        once transientAttempts calls failed.
+        """
+        self.__executor.submit(self.__invocationWorker, functionName, json.dumps(event), onFailed)
+
+    def __invocationWorker(self, functionName, payload, onFailed):
+        for attempt in range(1, self.transientAttempts + 1):
+            startTime = time.time()
+            try:
+                self.__lambdaClient.invoke(
+                    FunctionName=functionName,
+                    InvocationType="Event", #Async
+                    Payload=payload
+                )
+            except Exception as e:
+                self.stats.record(startTime, time.time(), False)
+                if isTransient(e) and attempt < self.transientAttempts:
+                    time.sleep(random.uniform(0, min(5.0, 0.1 * 2 ** attempt)))
+                    continue
+                throttled = isThrottle(e)
+                if not throttled:
+                    print("Invocation of", functionName, "failed:", repr(e))
+                if onFailed:
+                    onFailed(e, throttled)
+                return
+            self.stats.record(startTime, time.time(), True)
+            return
+
+    def shutdown(self):
+        """
+        Waits for all queued invocations to be issued and stops the worker threads.
+        """
+        self.__executor.shutdown(wait=True)
@@ -3,8 +3,19 @@ Contains code for the client which sets up the tasks and launches Lambdas.
 """
 import json
 import boto3
+from botocore.config import Config
 import time
-import threading
+import os
+import queue
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from invoker import Invoker
+from collector import CompletionCollector
+from scheduling import LongestFirstPolicy
+from journal import Journal, readJournal
+from concurrency import ConcurrencyController
+from results import decompressResult, copyResult
 
 class Task:
     """
@@ -14,70 +25,582 @@ class Task:
         command: A list of strings representing the command to be run on Lambda. Ex.: ["/tmp/myScript.exe", "arg1", "arg2"]. Notice that myScript.exe is expected to be located in /tmp/ as a result of moving the executable to the /tmp/ folder from where it can be launched in Lambda.
         name: A string representing an unique identifier for the task. This name will also be used as the file name of the results in S3 so the name must be a valid S3 file name.
         executableName: The name of the executable file that is being run on lambda. This parameter is needed since the executable cannot be run directly in Lambda's environment; each Lambda will copy the executable to /tmp/ and add executable permissions to run it.
+        cost: An estimate of how long the task runs, in any unit as long as it is the same for all tasks of a Job (ex. the product of the input sizes). Used for ordering the tasks, see scheduling.py.
+        compression: How the result is compressed while it is streamed to S3: "gzip", "zstd" (needs zstandard in the Lambda package) or "none". Compressed results are decompressed by the backends' readResult and downloadResult.
+        entryPoint: "module:function" of a Python function in the Lambda package which is called in the Lambda's own process as function(command, output_f) instead of running an executable (ex. "ssw_engine:alignTask"). command is then the list of arguments given to the function and executableName is not used.
+        cacheKey: A key identifying the task's result by everything it depends on (see cache.createCacheKey), or None. With a Job's cache, a task whose key already has a cached result is not run; see cache.py.
     """
-    def __init__(self, command, name, executableName, lambdaFunctionName):
+    def __init__(self, command, name, executableName, lambdaFunctionName, cost=None, compression="gzip", entryPoint=None, cacheKey=None):
         if type(command) is not list:
             raise TypeError("Command should be a list of strings.")
         self.command = command
         self.name = name
         self.executableName = executableName
         self.lambdaFunctionName = lambdaFunctionName
-        self.__lambdaClient = boto3.client('lambda')
-
-
-    def start(self, queueUrl, s3Bucket):
-        t = threading.Thread(target=self.__invocationWorker, args=(queueUrl, s3Bucket, ))
-        t.start()
-
-    def __invocationWorker(self, queueUrl, s3Bucket):
-        self.__lambdaClient.invoke(
-            FunctionName=self.lambdaFunctionName,
-            InvocationType="Event", #Async
-            Payload=json.dumps({
-                "taskName": self.name,
-                "executableName": self.executableName,
-                "command": self.command,
-                "sqsQueueUrl": queueUrl,
-                "s3Bucket": s3Bucket
-            })
+        self.cost = cost
+        self.compression = compression
+        self.entryPoint = entryPoint
+        self.cacheKey = cacheKey
+
+    def getSubtasks(self):
+        """
+        Returns the Tasks completed by this invocation (only this Task itself).
+        """
+        return [self]
+
+    def getPayload(self, queueUrl, s3Bucket, resultPrefix="", tasks=None):
+        """
+        Returns the event (as a dict) which the Lambda handler receives for this task. The result is stored as resultPrefix + name.
+        tasks is accepted for the same signature as TaskBatch.getPayload; a Task always runs itself.
+        """
+        return {
+            "taskName": self.name,
+            "resultKey": resultPrefix + self.name,
+            "executableName": self.executableName,
+            "command": self.command,
+            "compression": self.compression,
+            "entryPoint": self.entryPoint,
+            "sqsQueueUrl": queueUrl,
+            "s3Bucket": s3Bucket
+        }
+
+class TaskBatch:
+    """
+    Several Tasks executed one after another by a single Lambda invocation, which amortizes the invocation overhead over small tasks.
+    Each Task still reports its own completion. A TaskBatch can be used anywhere a Task can; see createBatches.
+
+    Attributes:
+        tasks: The list of Tasks in this batch. They all need to use the same Lambda function.
+        name: A string identifying the batch (derived from its first task).
+        cost: The sum of the costs of the tasks.
+    """
+    def __init__(self, tasks):
+        if len(tasks) == 0:
+            raise ValueError("A TaskBatch needs at least one Task.")
+        self.tasks = tasks
+        self.name = "batch-" + tasks[0].name
+        self.lambdaFunctionName = tasks[0].lambdaFunctionName
+        self.cost = sum(task.cost for task in tasks if task.cost is not None)
+
+    def getSubtasks(self):
+        """
+        Returns the Tasks completed by this invocation.
+        """
+        return self.tasks
+
+    def getPayload(self, queueUrl, s3Bucket, resultPrefix="", tasks=None):
+        """
+        Returns the event (as a dict) which the Lambda handler receives for this batch. Results are stored as resultPrefix + task name.
+        tasks: The tasks of the batch to run (ex. those a relaunch still needs), all of them if None.
+        """
+        return {
+            "tasks": [{"taskName": task.name, "resultKey": resultPrefix + task.name, "executableName": task.executableName, "command": task.command, "compression": task.compression, "entryPoint": task.entryPoint}
+                      for task in (self.tasks if tasks is None else tasks)],
+            "sqsQueueUrl": queueUrl,
+            "s3Bucket": s3Bucket
+        }
+
+def createBatches(tasks, targetDuration, costPerMs, maxBatchSize=50):
+    """
+    Packs small tasks into TaskBatches which are expected to run for at most targetDuration (ms).
+    costPerMs is the observed rate (task cost / compute time in ms), ex. the rates recorded by metrics_align_client.py.
+    Tasks which are expected to take targetDuration or longer, or have no cost, are left unbatched.
+    Returns a set of Tasks and TaskBatches which can be given to a Job.
+    """
+    targetCost = targetDuration * costPerMs
+    units = set()
+    openBatches = [] # [cost, [tasks]] of batches which are not full yet
+    # First-fit decreasing: every task goes into the first batch it fits in.
+    for task in sorted(tasks, key=lambda task: (task.cost if task.cost is not None else targetCost, task.name), reverse=True):
+        if task.cost is None or task.cost >= targetCost:
+            units.add(task)
+            continue
+        for batch in openBatches:
+            if batch[0] + task.cost <= targetCost and len(batch[1]) < maxBatchSize:
+                batch[0] += task.cost
+                batch[1].append(task)
+                break
+        else:
+            openBatches.append([task.cost, [task]])
+    for batchCost, batchTasks in openBatches:
+        units.add(batchTasks[0] if len(batchTasks) == 1 else TaskBatch(batchTasks))
+    return units
+
+class AwsBackend:
+    """
+    Executes tasks on AWS: invocations go to AWS Lambda, completion messages are read from AWS SQS and results are stored in AWS S3.
+    This is the default backend of a Job. Other backends (see local_backend.py) implement the same methods.
+
+    Attributes:
+        invokerWorkers: Number of threads (and pooled connections) used for invoking Lambdas. See invoker.py.
+        transferWorkers: Number of pooled S3 connections, so that many threads can read, copy or delete results at once through this backend.
+    """
+    def __init__(self, invokerWorkers=64, transferWorkers=32):
+        self.transferWorkers = transferWorkers
+        self.__invoker = Invoker(invokerWorkers)
+        self.__sqsClient = boto3.client("sqs")
+        self.__s3Client = boto3.client("s3", config=Config(max_pool_connections=transferWorkers))
+
+    def invoke(self, functionName, event, onFailed=None):
+        """
+        Launches (asynchronously) the function functionName with the given event.
+        onFailed(error, throttled) is called (from another thread) if the invocation is rejected.
+        """
+        self.__invoker.invoke(functionName, event, onFailed)
+
+    def getInvokeStats(self):
+        """
+        Returns the invoke rate and latency measurements (see invoker.InvokeStats).
+        """
+        return self.__invoker.stats.getStats()
+
+    def receiveCompletions(self, queueUrl, waitSeconds=0):
+        """
+        Returns a list of (at most 10) completion messages. Each message is a dict in the format of SQS's receive_message response.
+        With waitSeconds > 0 the call long-polls: it returns as soon as a message is available or after waitSeconds.
+        """
+        response = self.__sqsClient.receive_message(
+            QueueUrl=queueUrl,
+            MessageAttributeNames=[
+                "TaskName",
+                "StartTime",
+                "EndTime",
+                "Status",
+                "Timings",
+                "Attempt"
+            ],
+            MaxNumberOfMessages=10, #between 1 and 10
+            VisibilityTimeout=30,
+            WaitTimeSeconds=waitSeconds #between 0 and 20
+        )
+        return response.get("Messages", [])
+
+    def deleteCompletions(self, queueUrl, receiptHandles):
+        """
+        Deletes (at most 10) received completion messages from the queue with a single request.
+        """
+        response = self.__sqsClient.delete_message_batch(
+            QueueUrl=queueUrl,
+            Entries=[{"Id": str(i), "ReceiptHandle": receiptHandle} for i, receiptHandle in enumerate(receiptHandles)]
+        )
+        for failure in response.get("Failed", []):
+            print("Deleting completion message failed:", failure)
+
+    def releaseCompletions(self, queueUrl, receiptHandles):
+        """
+        Makes (at most 10) received but unprocessed completion messages visible in the queue again.
+        """
+        self.__sqsClient.change_message_visibility_batch(
+            QueueUrl=queueUrl,
+            Entries=[{"Id": str(i), "ReceiptHandle": receiptHandle, "VisibilityTimeout": 0} for i, receiptHandle in enumerate(receiptHandles)]
         )
 
+    def listResults(self, s3Bucket, prefix=""):
+        """
+        Returns the keys of all result objects in s3Bucket starting with prefix.
+        """
+        keys = []
+        paginator = self.__s3Client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=s3Bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                keys.append(obj["Key"])
+        return keys
+
+    def readResult(self, s3Bucket, key):
+        """
+        Returns the (uncompressed) content (bytes) of the result object key in s3Bucket.
+        """
+        return decompressResult(self.__s3Client.get_object(Bucket=s3Bucket, Key=key)["Body"].read())
+
+    def openResult(self, s3Bucket, key):
+        """
+        Returns a file-like object streaming the result object key in s3Bucket as stored (see results.iterateResult for its content).
+        """
+        return self.__s3Client.get_object(Bucket=s3Bucket, Key=key)["Body"]
+
+    def downloadResult(self, s3Bucket, key, path):
+        """
+        Streams the result object key in s3Bucket to the file at path, decompressing it on the way.
+        """
+        body = self.__s3Client.get_object(Bucket=s3Bucket, Key=key)["Body"]
+        with open(path, "wb") as result_f:
+            copyResult(body, result_f)
+
+    def copyObject(self, sourceBucket, sourceKey, destinationBucket, destinationKey):
+        """
+        Copies the object sourceKey of sourceBucket, as stored (compressed), to destinationKey of destinationBucket.
+        The copy is done by S3 (in parts for large objects); the object does not go through the client.
+        """
+        self.__s3Client.copy({"Bucket": sourceBucket, "Key": sourceKey}, destinationBucket, destinationKey)
+
+    def deleteResults(self, s3Bucket, keys):
+        """
+        Deletes the result objects keys of s3Bucket with delete_objects requests of up to 1000 keys, transferWorkers requests at once.
+        Returns the number of deleted objects.
+        """
+        keys = list(keys)
+        def deleteBatch(batch):
+            response = self.__s3Client.delete_objects(Bucket=s3Bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True})
+            for error in response.get("Errors", []):
+                print("Deleting " + s3Bucket + "/" + error["Key"] + " failed:", error.get("Code"), error.get("Message"))
+            return len(batch) - len(response.get("Errors", []))
+        with ThreadPoolExecutor(max_workers=self.transferWorkers) as executor:
+            return sum(executor.map(deleteBatch, [keys[i:i + 1000] for i in range(0, len(keys), 1000)]))
+
+    def purgeQueue(self, queueUrl):
+        """
+        Deletes all messages of the queue. SQS allows one purge per queue every 60 seconds.
+        """
+        self.__sqsClient.purge_queue(QueueUrl=queueUrl)
+
+    def shutdown(self):
+        """
+        Waits for all queued invocations to be issued and stops the invoker's threads.
+        """
+        self.__invoker.shutdown()
+
 class Job:
     """
     A job consisting of a set of tasks to be executed using Lambda.
 
+    Every invocation (Task or TaskBatch) has a deadline. An invocation running longer than taskTimeout is considered lost
+    and is relaunched; one running much longer than its cost and the observed rate predict is relaunched speculatively
+    while a slot is free. The first completion of a task wins. Tasks whose Lambda reports a failure are retried.
+    Each invocation is launched at most maxAttempts times; tasks which still fail are reported by getFailedTasks().
+
     Attributes:
-        tasks: A set of Tasks which define this job.
-        concurrencyLimit: Maximum number of Lambdas to be run at any one time.
+        tasks: A set of Tasks (or TaskBatches) which define this job. Each is run by one Lambda invocation.
+        concurrencyLimit: Maximum number of Lambdas to be run at any one time. With a controller this is the upper bound of the adaptive limit.
         sqsQueueUrl: The url of the SQS Queue being used for reporting finished Lambda tasks.
         s3Bucket: The S3 bucket for storing the results.
+        backend: The backend executing the tasks. Defaults to AwsBackend; a LocalBackend (see local_backend.py) runs the same job on the local machine.
+        receivers: Number of threads long-polling the queue for completion messages. Defaults to one per 100 concurrent tasks (at most 10).
+        policy: Decides the order in which the tasks are launched (see scheduling.py). Defaults to LongestFirstPolicy, launching the tasks with the highest cost first.
+        maxAttempts: Maximum number of launches (first launch, retries and speculative launches) of each invocation.
+        taskTimeout: Time (ms) after which a running invocation is considered lost. Should be at least the Lambda's timeout.
+        speculationSlack: An invocation is relaunched speculatively once it runs speculationSlack times longer than expected.
+        speculationMinimum: Minimum time (ms) an invocation runs before it is relaunched speculatively.
+        journalPath: Path of a local file to which every launch and completion is appended (see journal.py). No journal is kept if None.
+        resume: Whether the tasks completed by an earlier run are skipped, so an interrupted Job can be rerun without redoing them. These are the tasks the journal at journalPath lists as completed and whose result still exists in s3Bucket, or without a journal all tasks whose result exists in s3Bucket.
+        controller: A ConcurrencyController (see concurrency.py) adapting the concurrency limit to throttles, queue latency and the completion rate. The limit is fixed if None.
+        throttleBackoff: Time (ms) an invocation rejected because of throttling waits before it is launched again, doubled with every further throttle of the same invocation up to maxThrottleBackoff. Throttled launches do not count against maxAttempts; any other rejection of an invocation (ex. a wrong function name, missing permissions) does.
+        maxThrottleBackoff: Maximum wait (ms) of a throttled invocation.
+        cache: A ResultCache (see cache.py). Tasks whose cacheKey has a cached result get it copied to s3Bucket instead of being run, and the results of the tasks which ran are added to the cache at the end of the Job. No cache is used if None.
+        resultPrefix: Prefix of the keys of this Job's results (ex. a job id followed by "/"): the result of a task is stored as resultPrefix + task.name, so Jobs sharing a bucket can be resumed and cleaned up (see cleanup) separately.
     """
-    def __init__(self, tasks, concurrencyLimit, sqsQueueUrl, s3Bucket):
+    def __init__(self, tasks, concurrencyLimit, sqsQueueUrl, s3Bucket, backend=None, receivers=None, policy=None,
+                 maxAttempts=3, taskTimeout=330000, speculationSlack=2.0, speculationMinimum=10000, journalPath=None, resume=False,
+                 controller=None, throttleBackoff=200, maxThrottleBackoff=10000, cache=None, resultPrefix=""):
         if type(tasks) is not set:
             raise TypeError("tasks should be a set of Tasks.")
         self.tasks = tasks
         self.concurrencyLimit = concurrencyLimit
         self.queueUrl = sqsQueueUrl
         self.s3Bucket = s3Bucket
-        self.__sqsClient = boto3.client("sqs")
+        self.backend = backend if backend is not None else AwsBackend()
+        self.receivers = receivers if receivers else max(1, min(10, concurrencyLimit // 100))
+        self.policy = policy if policy is not None else LongestFirstPolicy()
+        self.maxAttempts = maxAttempts
+        self.taskTimeout = taskTimeout
+        self.speculationSlack = speculationSlack
+        self.speculationMinimum = speculationMinimum
+        self.journalPath = journalPath
+        self.resume = resume
+        self.controller = controller
+        self.throttleBackoff = throttleBackoff
+        self.maxThrottleBackoff = maxThrottleBackoff
+        self.cache = cache
+        self.resultPrefix = resultPrefix
+        self.__journal = None
+        self.__rejectedInvocations = queue.Queue() # (invocation, attemptId, error, throttled) of invocations the backend could not launch
+        self.__pendingTasks = deque() # Tasks not launched yet, in launch order
+        self.__delayedInvocations = [] # [time (ms) from which it may be launched, invocation] of rejected invocations waiting to be relaunched
+        self.__throttles = {} #invocation name - number of times it was throttled
         self.__taskTimesInternal = {} #task.name - [startTime, endTime]. This is a measurement of the compute time inside lambda
         self.__taskTimesExternal = {} #task.name - [startTime, endTime]. This is a measurement of the total time it took for this task, including starting it up, lambda compute time and the time it took to collect its message from SQS
         self.__taskMessages = {} #task.name - message body (SQS message)
-        for task in self.tasks:
-            self.__taskTimesInternal[task.name] = [0, 0]
-            self.__taskTimesExternal[task.name] = [0, 0]
-            self.__taskMessages[task.name] = "No message received."
-        self.__concurrentTasksCount = 0
+        self.__taskTimings = {} #task.name - dict of cold start flag, init duration and phase durations (ms) reported by lambda, plus the notify time measured here
+        self.__invocations = {} #task.name - the Task or TaskBatch which runs it
+        self.__invocationsByName = {} #invocation name - the Task or TaskBatch
+        self.__remainingSubtasks = {} #invocation name - number of its tasks not completed yet
+        self.__attempts = {} #invocation name - launch times (ms) of all its attempts
+        self.__runningAttempts = {} #invocation name - launch times (ms) of its attempts which may still be running
+        self.__runningAttemptIds = {} #invocation name - ids ("<invocation name>#<launch number>") of the same attempts
+        self.__launchCount = 0 # Number of launches so far, numbering the attempt ids (throttled attempts are not kept in __attempts)
+        self.__failedTasks = {} #task.name - the reason it failed
+        self.__skippedTasks = set() #task.name of the tasks whose result already existed
+        self.__cachedTasks = set() #task.name of the tasks whose result was copied from the cache
+        for invocation in self.tasks:
+            self.__invocationsByName[invocation.name] = invocation
+            self.__remainingSubtasks[invocation.name] = len(invocation.getSubtasks())
+            self.__attempts[invocation.name] = []
+            self.__runningAttempts[invocation.name] = []
+            self.__runningAttemptIds[invocation.name] = []
+            for task in invocation.getSubtasks():
+                self.__invocations[task.name] = invocation
+                self.__taskTimesInternal[task.name] = [0, 0]
+                self.__taskTimesExternal[task.name] = [0, 0]
+                self.__taskMessages[task.name] = "No message received."
+        self.__concurrentTasksCount = 0 # Number of running invocations
         self.__completedTasks = 0
+        self.__completedNames = set()
+        self.__completedCost = 0 # Sum of the costs of the successfully completed tasks...
+        self.__completedComputeTime = 0 # ... and of their compute times (ms), giving the observed rate.
 
     def __getTimeMs(self):
         return int(round(time.time() * 1000))
 
-    def __startNextTask(self):
-        nextTask = self.tasks.pop()
-        self.__taskTimesExternal[nextTask.name][0] = self.__getTimeMs()
+    # Returns the tasks of the invocation which it still has to run: not completed (ex. restored from the cache, or done by an
+    # earlier attempt) and not detached from it.
+    def __getOutstandingTasks(self, invocation):
+        return [task for task in invocation.getSubtasks() if task.name not in self.__completedNames and self.__invocations[task.name] is invocation]
+
+    def __launch(self, invocation):
+        outstandingTasks = self.__getOutstandingTasks(invocation)
+        if not outstandingTasks:
+            return
+        launchTime = self.__getTimeMs()
+        if not self.__attempts[invocation.name]:
+            for task in invocation.getSubtasks():
+                self.__taskTimesExternal[task.name][0] = launchTime
+        self.__attempts[invocation.name].append(launchTime)
+        self.__runningAttempts[invocation.name].append(launchTime)
+        self.__launchCount += 1
+        attemptId = invocation.name + "#" + str(self.__launchCount)
+        self.__runningAttemptIds[invocation.name].append(attemptId)
         self.__concurrentTasksCount += 1
-        nextTask.start(self.queueUrl, self.s3Bucket)
+        if self.__journal:
+            self.__journal.recordLaunch(invocation.name, [task.name for task in outstandingTasks], len(self.__attempts[invocation.name]))
+        payload = invocation.getPayload(self.queueUrl, self.s3Bucket, self.resultPrefix, outstandingTasks)
+        payload["attemptId"] = attemptId # Sent back in the completion messages, see __handleMessage
+        self.backend.invoke(invocation.lambdaFunctionName, payload,
+                            lambda error, throttled: self.__rejectedInvocations.put((invocation, attemptId, error, throttled)))
+
+    def __startNextTask(self):
+        self.__launch(self.__pendingTasks.popleft())
+
+    def __getConcurrencyLimit(self):
+        if self.controller is None:
+            return self.concurrencyLimit
+        return min(self.concurrencyLimit, self.controller.limit)
+
+    def __fillSlots(self):
+        for i in range(0, min(len(self.__pendingTasks), self.__getConcurrencyLimit() - self.__concurrentTasksCount)):
+            self.__startNextTask()
+
+    # Handles the invocations the backend rejected. A throttled invocation is relaunched after a backoff (see throttleBackoff) and
+    # its attempt does not count against maxAttempts. Any other rejection counts as a failed attempt: the invocation is
+    # relaunched after a backoff while it has attempts left, then its remaining tasks fail.
+    def __requeueRejectedInvocations(self):
+        while not self.__rejectedInvocations.empty():
+            invocation, attemptId, error, throttled = self.__rejectedInvocations.get()
+            if attemptId in self.__runningAttemptIds[invocation.name]:
+                self.__endAttempt(invocation.name, attemptId) # Not the other attempts (ex. the original of a rejected speculative copy)
+            if throttled:
+                if self.controller is not None:
+                    self.controller.onThrottle()
+                self.__attempts[invocation.name].pop()
+                self.__throttles[invocation.name] = self.__throttles.get(invocation.name, 0) + 1
+                backoff = min(self.maxThrottleBackoff, self.throttleBackoff * 2 ** (self.__throttles[invocation.name] - 1))
+            else:
+                backoff = self.throttleBackoff
+            if self.__remainingSubtasks[invocation.name] == 0 or self.__runningAttempts[invocation.name]:
+                continue # Completed, or another attempt is still running it
+            if throttled or len(self.__attempts[invocation.name]) < self.maxAttempts:
+                self.__delayedInvocations.append([self.__getTimeMs() + random.uniform(0.5, 1.0) * backoff, invocation])
+                continue
+            for task in self.__getOutstandingTasks(invocation):
+                self.__failTask(task.name, "Task " + task.name + " could not be invoked after " + str(len(self.__attempts[invocation.name])) +
+                                " attempts: " + repr(error))
+
+    # Puts the rejected invocations whose backoff has passed back at the front of the queue.
+    def __releaseDelayedInvocations(self):
+        now = self.__getTimeMs()
+        ready = [invocation for readyTime, invocation in self.__delayedInvocations if readyTime <= now]
+        self.__delayedInvocations = [entry for entry in self.__delayedInvocations if entry[0] > now]
+        for invocation in reversed(ready):
+            if self.__remainingSubtasks[invocation.name] > 0:
+                self.__pendingTasks.appendleft(invocation)
+
+    # Returns how long (s) the Job can wait for a message before a delayed invocation becomes ready (at most 1 s).
+    def __getWaitTime(self):
+        if not self.__rejectedInvocations.empty():
+            return 0.01
+        if not self.__delayedInvocations:
+            return 1
+        return max(0.01, min(1, (min(readyTime for readyTime, _ in self.__delayedInvocations) - self.__getTimeMs()) / 1000.0))
+
+    # Launches the invocation again if it has attempts left. Returns whether it was relaunched.
+    def __retry(self, invocation, reason):
+        if len(self.__attempts[invocation.name]) >= self.maxAttempts:
+            return False
+        print("Relaunching " + invocation.name + " (" + reason + "), attempt " + str(len(self.__attempts[invocation.name]) + 1) + " of " + str(self.maxAttempts) + ".")
+        self.__launch(invocation)
+        return True
+
+    # Forgets the count oldest running attempts of the invocation (all of them by default), freeing their slots.
+    def __endAttempts(self, invocationName, count=None):
+        runningAttempts = self.__runningAttempts[invocationName]
+        ended = len(runningAttempts) if count is None else min(count, len(runningAttempts))
+        del runningAttempts[0:ended]
+        del self.__runningAttemptIds[invocationName][0:ended]
+        self.__concurrentTasksCount -= ended
+
+    # Forgets the running attempt attemptId of the invocation, freeing its slot.
+    def __endAttempt(self, invocationName, attemptId):
+        index = self.__runningAttemptIds[invocationName].index(attemptId)
+        del self.__runningAttempts[invocationName][index]
+        del self.__runningAttemptIds[invocationName][index]
+        self.__concurrentTasksCount -= 1
+
+    def __completeTask(self, taskName):
+        self.__completedNames.add(taskName)
+        self.__completedTasks += 1
+        invocationName = self.__invocations[taskName].name
+        self.__remainingSubtasks[invocationName] -= 1
+        if self.__remainingSubtasks[invocationName] == 0:
+            # Speculative copies still running are not waited for; their messages are ignored as duplicates.
+            self.__endAttempts(invocationName)
+
+    # reason names the task (ex. the handler's "Task <name> failed: ..." message body).
+    # Takes the task taskName out of the TaskBatch batch so that it can be relaunched alone, without the batch's other tasks.
+    # The task keeps the batch's attempts (against maxAttempts); the batch's attempts end once it has no task left to run.
+    # Returns the task, which is its own invocation from now on.
+    def __detachTask(self, batch, taskName):
+        task = next(task for task in batch.getSubtasks() if task.name == taskName)
+        self.__invocations[taskName] = task
+        self.__invocationsByName[task.name] = task
+        self.__remainingSubtasks[task.name] = 1
+        self.__attempts[task.name] = list(self.__attempts[batch.name])
+        self.__runningAttempts[task.name] = []
+        self.__runningAttemptIds[task.name] = []
+        self.__remainingSubtasks[batch.name] -= 1
+        if self.__remainingSubtasks[batch.name] == 0:
+            self.__endAttempts(batch.name)
+        return task
+
+    def __failTask(self, taskName, reason):
+        print(reason)
+        self.__failedTasks[taskName] = reason
+        self.__completeTask(taskName)
+        if self.__journal:
+            self.__journal.recordCompletion(taskName, "Failed")
+
+    def __handleMessage(self, msg):
+        attributes = msg["MessageAttributes"]
+        taskName = attributes["TaskName"]["StringValue"]
+        if taskName in self.__completedNames:
+            return # Duplicate delivery or a slower copy of the task
+
+        invocation = self.__invocations[taskName]
+        if "Status" in attributes and attributes["Status"]["StringValue"] == "Failed":
+            # Messages of older handlers carry no attempt id; their failure can only be matched to an attempt if a single one
+            # is running. Otherwise the attempts are left to their deadline (see taskTimeout).
+            attemptId = attributes["Attempt"]["StringValue"] if "Attempt" in attributes else None
+            if attemptId is None and len(self.__runningAttemptIds[invocation.name]) == 1:
+                attemptId = self.__runningAttemptIds[invocation.name][0]
+            if attemptId not in self.__runningAttemptIds[invocation.name]:
+                return # Reported by an attempt which is no longer current (ex. a copy of the batch the task was detached from)
+            self.__taskMessages[taskName] = msg["Body"]
+            if len(invocation.getSubtasks()) > 1:
+                invocation = self.__detachTask(invocation, taskName)
+            else:
+                self.__endAttempt(invocation.name, attemptId)
+            if not self.__retry(invocation, "failed"):
+                self.__failTask(taskName, msg["Body"])
+            return
+
+        self.__taskMessages[taskName] = msg["Body"]
+        self.__taskTimesExternal[taskName][1] = self.__getTimeMs()
+        self.__taskTimesInternal[taskName] = (int(attributes["StartTime"]["StringValue"]), int(attributes["EndTime"]["StringValue"]))
+        if "Timings" in attributes:
+            self.__taskTimings[taskName] = json.loads(attributes["Timings"]["StringValue"])
+            self.__taskTimings[taskName]["notify"] = self.__taskTimesExternal[taskName][1] - self.__taskTimesInternal[taskName][1]
+        if self.controller is not None:
+            self.controller.onCompletion(self.__taskTimesExternal[taskName][1] - self.__taskTimesInternal[taskName][1])
+        task = next(task for task in invocation.getSubtasks() if task.name == taskName)
+        if task.cost is not None:
+            self.__completedCost += task.cost
+            self.__completedComputeTime += self.__taskTimesInternal[taskName][1] - self.__taskTimesInternal[taskName][0]
+        self.__completeTask(taskName)
+        if self.__journal:
+            self.__journal.recordCompletion(taskName, "Succeeded")
+
+    # Marks the completed tasks of an earlier run as completed. Invocations left with nothing to do are not launched.
+    # With the records of an earlier run's journal, the tasks it lists as completed are skipped; the result listing only checks
+    # that their results still exist. Without a journal every task whose result object exists is skipped.
+    def __skipExistingResults(self, journalRecords=None):
+        existingResults = set(self.backend.listResults(self.s3Bucket, self.resultPrefix))
+        if journalRecords is None:
+            completed = set(taskName for taskName in self.__invocations if self.getResultKey(taskName) in existingResults)
+        else:
+            completed = set()
+            for record in journalRecords:
+                if record["event"] in ("skip", "cached") or (record["event"] == "complete" and record["status"] == "Succeeded"):
+                    completed.add(record["task"])
+                elif record["event"] == "complete":
+                    completed.discard(record["task"])
+            missing = set(taskName for taskName in completed if taskName in self.__invocations and self.getResultKey(taskName) not in existingResults)
+            print("Journal [" + self.journalPath + "] lists " + str(len(completed)) + " completed tasks, " + str(len(missing)) + " of them without a result; these are run again.")
+            completed -= missing
+        for taskName in self.__invocations:
+            if taskName in completed:
+                self.__skippedTasks.add(taskName)
+                self.__completeTask(taskName)
+                if self.__journal:
+                    self.__journal.recordSkip(taskName)
+        print("Resuming: skipping " + str(len(self.__skippedTasks)) + " tasks whose results already exist in [" + self.s3Bucket + "].")
+
+    # Copies the cached results of the tasks whose cacheKey is in the cache and marks them as completed, like skipped tasks.
+    # A TaskBatch is still launched if any of its tasks has no cached result.
+    def __restoreCachedResults(self):
+        cachedKeys = self.cache.listKeys(self.backend)
+        entries = [(task.cacheKey, self.getResultKey(task.name))
+                   for invocation in self.tasks for task in invocation.getSubtasks()
+                   if task.cacheKey in cachedKeys and task.name not in self.__completedNames]
+        failed = set(self.cache.restore(self.backend, entries, self.s3Bucket))
+        for cacheKey, resultKey in entries:
+            if resultKey in failed:
+                continue
+            taskName = resultKey[len(self.resultPrefix):]
+            self.__cachedTasks.add(taskName)
+            self.__completeTask(taskName)
+            if self.__journal:
+                self.__journal.recordCached(taskName)
+        print("Cache: " + str(len(self.__cachedTasks)) + " tasks satisfied from [" + self.cache.bucket + "].")
+
+    # Adds the results of the tasks which ran successfully in this Job to the cache.
+    def __storeResultsInCache(self):
+        entries = [(task.cacheKey, self.getResultKey(task.name)) for invocation in self.tasks for task in invocation.getSubtasks()
+                   if task.cacheKey is not None and task.name in self.__completedNames and task.name not in self.__failedTasks
+                   and task.name not in self.__cachedTasks and task.name not in self.__skippedTasks]
+        failed = self.cache.store(self.backend, entries, self.s3Bucket)
+        print("Cache: stored " + str(len(entries) - len(failed)) + " results in [" + self.cache.bucket + "].")
+
+    # Returns how long (ms) the invocation is expected to run based on its cost and the observed rate, or None if unknown.
+    def __expectedDuration(self, invocation):
+        if not invocation.cost or self.__completedCost <= 0 or self.__completedComputeTime <= 0:
+            return None
+        return invocation.cost * self.__completedComputeTime / self.__completedCost
+
+    def __checkDeadlines(self):
+        now = self.__getTimeMs()
+        for invocationName, runningAttempts in self.__runningAttempts.items():
+            if not runningAttempts or self.__remainingSubtasks[invocationName] == 0:
+                continue
+            invocation = self.__invocationsByName[invocationName]
+            lostAttempts = len([launchTime for launchTime in runningAttempts if now - launchTime > self.taskTimeout])
+            if lostAttempts > 0:
+                self.__endAttempts(invocationName, lostAttempts)
+                if not runningAttempts and not self.__retry(invocation, "timed out"):
+                    for task in self.__getOutstandingTasks(invocation):
+                        self.__failTask(task.name, "Task " + task.name + " timed out after " + str(len(self.__attempts[invocationName])) + " attempts.")
+                continue
+            expectedDuration = self.__expectedDuration(invocation)
+            if expectedDuration is None or len(runningAttempts) > 1 or self.__concurrentTasksCount >= self.__getConcurrencyLimit():
+                continue
+            if now - runningAttempts[0] > max(self.speculationMinimum, self.speculationSlack * expectedDuration):
+                self.__retry(invocation, "straggling")
 
     def executeAllTasks(self):
         """
@@ -85,46 +608,116 @@ class Job:
         """
         startTime = self.__getTimeMs()
 
-        taskMessages = []
-        totalTasks = len(self.tasks)
-        
-        # Start initial min(totalTasks, self.concurrencyLimit) number of tasks.
-        for i in range(0, min(totalTasks, self.concurrencyLimit)):
-            self.__startNextTask()
+        totalTasks = len(self.__invocations)
+        journalRecords = None
+        if self.resume and self.journalPath and os.path.exists(self.journalPath):
+            journalRecords = readJournal(self.journalPath)
+        if self.journalPath:
+            self.__journal = Journal(self.journalPath)
+        if self.resume:
+            self.__skipExistingResults(journalRecords)
+        if self.cache is not None:
+            self.__restoreCachedResults()
+        self.__pendingTasks = deque(self.policy.order([invocation for invocation in self.tasks if self.__remainingSubtasks[invocation.name] > 0]))
 
-        # Poll SQS until the finished message of each task is collected. Any time a finished message is received, it is deleted and a new task is started.
+        # Start initial min(number of invocations, self.concurrencyLimit) number of invocations.
+        self.__fillSlots()
+
+        # Collect the finished message of each task. Any time a finished message is received, it is acknowledged and a new task is started.
+        collector = CompletionCollector(self.backend, self.queueUrl, self.receivers)
+        collector.start()
+        lastDeadlineCheck = startTime
         while self.__completedTasks < totalTasks:
-            response = self.__sqsClient.receive_message(
-                QueueUrl=self.queueUrl,
-                MessageAttributeNames=[
-                    "TaskName",
-                    "StartTime",
-                    "EndTime"
-                ],
-                MaxNumberOfMessages=10, #between 1 and 10
-                VisibilityTimeout=5
-            )
-            #print(json.dumps(response, indent=4, sort_keys=True))
-            if "Messages" in response:
-                for msg in response["Messages"]:
-                    taskName = msg["MessageAttributes"]["TaskName"]["StringValue"]
-
-                    self.__taskMessages[taskName] = msg["Body"]
-                    self.__taskTimesExternal[taskName][1] = self.__getTimeMs()
-                    self.__taskTimesInternal[taskName] = (int(msg["MessageAttributes"]["StartTime"]["StringValue"]), int(msg["MessageAttributes"]["EndTime"]["StringValue"]))
-                    self.__completedTasks += 1
-                    self.__concurrentTasksCount -= 1
-                    self.__sqsClient.delete_message(
-                        QueueUrl=self.queueUrl,
-                        ReceiptHandle=msg["ReceiptHandle"]
-                    )
-                for i in range(0, min(len(self.tasks), self.concurrencyLimit - self.__concurrentTasksCount)):
-                    self.__startNextTask()
-            time.sleep(0.2) #Wait 200 ms before polling SQS again
+            msg = collector.getMessage(timeout=self.__getWaitTime())
+            if msg is None:
+                # Nothing arrived for a while; don't hold back the pending acknowledgements.
+                collector.flush()
+            else:
+                #print(json.dumps(msg, indent=4, sort_keys=True))
+                collector.acknowledge(msg["ReceiptHandle"])
+                self.__handleMessage(msg)
+            self.__requeueRejectedInvocations()
+            self.__releaseDelayedInvocations()
+            if self.__getTimeMs() - lastDeadlineCheck >= 1000:
+                self.__checkDeadlines()
+                lastDeadlineCheck = self.__getTimeMs()
+            if self.controller is not None:
+                self.controller.update(self.__getTimeMs(), self.__concurrentTasksCount)
+            self.__fillSlots()
 
         endTime = self.__getTimeMs()
 
         self.__totalTime = endTime - startTime
+        collector.stop()
+        if self.cache is not None:
+            self.__storeResultsInCache()
+        if self.__journal:
+            self.__journal.close()
+            self.__journal = None
 
     def getTasksTimes(self):
-        return (self.__totalTime, self.__taskTimesInternal, self.__taskTimesExternal)
\ No newline at end of file
+        return (self.__totalTime, self.__taskTimesInternal, self.__taskTimesExternal)
+
+    def getTaskTimings(self):
+        """
+        Returns a dict task.name - timings of the successful tasks: "cold" (whether the task ran first in a new Lambda container),
+        "initDuration" (ms spent loading the handler, for cold tasks) and the duration (ms) of the "prepare", "execute", "upload"
+        and "notify" (from the end of the task to the receipt of its message) phases. "upload" is only the part of the upload
+        which did not overlap the execution. "outputBytes" and "storedBytes" are the result size before and after compression.
+        """
+        return self.__taskTimings
+
+    def getFailedTasks(self):
+        """
+        Returns a dict task.name - reason (a message naming the task, ex. "Task 1-2 failed: ...") for the tasks which did not complete successfully within maxAttempts.
+        """
+        return self.__failedTasks
+
+    def getSkippedTasks(self):
+        """
+        Returns the set of task names which were skipped because their result already existed (see resume).
+        """
+        return self.__skippedTasks
+
+    def getResultKey(self, taskName):
+        """
+        Returns the key of the result of the task taskName in s3Bucket.
+        """
+        return self.resultPrefix + taskName
+
+    def cleanup(self, purgeQueue=False):
+        """
+        Deletes the results of this Job's tasks from s3Bucket (other objects, ex. of other Jobs sharing the bucket, are kept),
+        and with purgeQueue all messages of the queue (only if no other Job uses it). Can be called once the results were
+        downloaded or verified. Returns the number of deleted results.
+        """
+        resultKeys = set(self.getResultKey(taskName) for taskName in self.__invocations)
+        deleted = self.backend.deleteResults(self.s3Bucket, [key for key in self.backend.listResults(self.s3Bucket, self.resultPrefix) if key in resultKeys])
+        if purgeQueue:
+            self.backend.purgeQueue(self.queueUrl)
+        print("Cleanup: deleted " + str(deleted) + " results from [" + self.s3Bucket + "].")
+        return deleted
+
+    def getCachedTasks(self):
+        """
+        Returns the set of task names whose result was copied from the cache (see cache) instead of being computed.
+        """
+        return self.__cachedTasks
+
+    def getAttempts(self):
+        """
+        Returns a dict invocation name - number of times it was launched.
+        """
+        return {invocationName: len(attempts) for invocationName, attempts in self.__attempts.items()}
+
+    def getInvokeStats(self):
+        """
+        Returns the invoke rate and latency measured by the backend (see invoker.InvokeStats).
+        """
+        return self.backend.getInvokeStats()
+
+    def getConcurrencyHistory(self):
+        """
+        Returns the list of (time in ms, limit) changes of the adaptive concurrency limit, or an empty list without a controller.
+        """
+        return self.controller.history if self.controller is not None else []
\ No newline at end of file
@@ -5,22 +5,23 @@ also records various metrics, downloads and checks result files as well as creat
 lambdaName = r"<AWS Lambda ARN>" #The ARN of the AWS Lambda function
 sqsQueueUrl = r"<SQS Queue Url>" #The URL of the AWS SQS Queue
 s3ResultsBucket = r"alignment-results" #The bucket name of the AWS S3 Bucket
-# verifyResults - Whether ssw alignments from AWS Lambda should be checked against local alignment scores.
+# verifyResults - Whether ssw alignments from AWS Lambda should be checked against local alignment scores (see verify_results.py).
 # If you enable this you will also need to make sure that the alignment scores are available locally. See more in main().
-verifyResults = False 
+verifyResults = False
 
 import lambda_client as lc
+import verify_results
 import pathlib
 import matplotlib.pyplot as plt
 import matplotlib.mlab as mlab
 from scipy.stats import norm
 import numpy as np
 import os
-import boto3
-from filecmp import dircmp
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 def createTasks():
-    totalPartitions = 41
+    totalPartitions = getPartitionCount()
     tasks = set()
     for i in range(1, totalPartitions + 1):
         for j in range(i, totalPartitions + 1):
@@ -36,7 +37,8 @@ def createTasks():
                 ],
                 name=str(i) + "-" + str(j),
                 executableName="ssw_test",
-                lambdaFunctionName=lambdaName
+                lambdaFunctionName=lambdaName,
+                cost=getJobSize(i, j)
                 )
             )
     return tasks
@@ -50,51 +52,61 @@ def createJob(concurrencyLimit):
     )
     return job
 
-def downloadResults(s3Bucket, resultsPath):
+# Downloads (and decompresses) all results in s3Bucket to resultsPath, workers results at a time.
+def downloadResults(s3Bucket, resultsPath, workers=32):
     pathlib.Path(resultsPath).mkdir(parents=True, exist_ok=True)
-    my_bucket = boto3.resource('s3').Bucket(s3Bucket)
-
-    for object in my_bucket.objects.all():
-        my_bucket.download_file(object.key, resultsPath + object.key)
-
-def areFoldersDifferent(dir1, dir2):
-    dcmp = dircmp(dir1, dir2)
-    differences = len(dcmp.diff_files) + len(dcmp.left_only) + len(dcmp.right_only)
-    return differences > 0
-
-def verifyResults(basisResultsPath, trialResultsPath, metricsPath):
-    with open(metricsPath + "verification.txt", "w") as output_f:
-        if areFoldersDifferent(basisResultsPath, trialResultsPath):
-            output_f.write("Basis results at [" + basisResultsPath + "] were DIFFERENT (INCORRECT) from trial results in [" + trialResultsPath + "]\n")
-        else:
-            output_f.write("Basis results at [" + basisResultsPath + "] were IDENTICAL (CORRECT) to trial results in [" + trialResultsPath + "]\n")
-
-def cleanup(s3Bucket, queueUrl):
-    my_bucket = boto3.resource('s3').Bucket(s3Bucket)
-    s3Client = boto3.client("s3")
-    for object in my_bucket.objects.all():
-        s3Client.delete_object(
-            Bucket=s3Bucket,
-            Key=object.key
-        )
-    sqsClient = boto3.client("sqs") 
-    sqsClient.purge_queue(
-        QueueUrl=queueUrl
-    )
+    backend = lc.AwsBackend(transferWorkers=workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda key: backend.downloadResult(s3Bucket, key, resultsPath + key), backend.listResults(s3Bucket)))
+
+# Returns the manifest written by partitionProteins.py next to the partitions (protein and residue counts of each partition),
+# or None if the partitions have no manifest.
+def loadPartitionManifest():
+    manifestPath = r"./proteinPartitions/manifest.json"
+    if not os.path.exists(manifestPath):
+        return None
+    with open(manifestPath, "r") as manifest_f:
+        return json.load(manifest_f)
+
+partitionManifest = loadPartitionManifest()
+
+# Returns the number of protein partitions.
+def getPartitionCount():
+    return len(partitionManifest["partitions"]) if partitionManifest else 41
 
-# Returns the file size (KB) for the protein partition with the corresponding partitionNumber
+# Returns the size of the protein partition with the corresponding partitionNumber: thousands of residues from the manifest,
+# or the file size (KB) without one.
 def getPartitionSize(partitionNumber):
+    if partitionManifest:
+        return partitionManifest["partitions"][partitionNumber - 1]["residues"] / 1000.0
     return os.path.getsize(r"./proteinPartitions/partition" + str(partitionNumber) + ".fasta") / 1000.0
 
 def getJobSize(partition1, partition2):
     return getPartitionSize(partition1) * getPartitionSize(partition2)
 
-def recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, metricsPath, totalTime):
+# Writes the cold/warm flag and phase durations (ms) of every task (see Job.getTaskTimings) to taskTimings.csv, and
+# the mean phase durations of cold and warm tasks to phaseSummary.txt.
+def recordTaskTimings(taskTimings, metricsPath):
+    phases = ["initDuration", "prepare", "execute", "upload", "notify"]
+    pathlib.Path(metricsPath).mkdir(parents=True, exist_ok=True)
+    with open(metricsPath + "taskTimings.csv", "w") as output_f:
+        output_f.write("TaskName, Cold, InitDuration, Prepare, Execute, Upload, Notify, OutputBytes, StoredBytes\n")
+        for taskName, timings in sorted(taskTimings.items()):
+            output_f.write(taskName + ", " + str(int(timings.get("cold", False))) + ", " + ", ".join(str(timings.get(field, 0)) for field in phases + ["outputBytes", "storedBytes"]) + "\n")
+    with open(metricsPath + "phaseSummary.txt", "w") as summary_f:
+        for label, cold in [("Cold", True), ("Warm", False)]:
+            group = [timings for timings in taskTimings.values() if timings.get("cold", False) == cold]
+            summary_f.write(label + " Tasks: " + str(len(group)) + "\n")
+            if group:
+                summary_f.write(", ".join(phase + " Mean: " + str(np.mean([timings.get(phase, 0) for timings in group])) for phase in phases) + "\n")
+
+def recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, metricsPath, totalTime, invokeStats=None):
     internalCompletionTime = []
     externalCompletionTime = []
     tasks = []
     counter = 1
-    totalPartitions = 41
+    totalPartitions = getPartitionCount()
     pathlib.Path(metricsPath).mkdir(parents=True, exist_ok=True)
 
     taskSizesCold = []
@@ -111,8 +123,9 @@ def recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, met
         output_f.write("TaskName, TaskNumber, InternalCompletionTime, ExternalCompletionTime, TaskSize\n")
         for i in range(1, totalPartitions + 1):
             for j in range(i, totalPartitions + 1):
-                tasks.append(counter)
                 taskName = str(i) + "-" + str(j)
+                if internalTimes[taskName][1] == 0:
+                    continue # Failed task, see failedTasks.txt
                 internalTime = internalTimes[taskName][1] - internalTimes[taskName][0]
                 externalTime = externalTimes[taskName][1] - externalTimes[taskName][0]
                 taskSize = getJobSize(i, j)
@@ -127,6 +140,7 @@ def recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, met
                     internalCompletionTimeWarm.append(internalTime)
                     externalCompletionTimeWarm.append(externalTime)
 
+                tasks.append(counter)
                 internalCompletionTime.append(internalTime)
                 externalCompletionTime.append(externalTime)
                 output_f.write(taskName + ", " + str(counter) + ", " + str(internalTime) + ", " + str(externalTime) + ", " + str(taskSize) + "\n")
@@ -147,6 +161,9 @@ def recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, met
             summary_f.write(missmatch)
         if len(missmatches) == 0:
             summary_f.write("No Missmatches.\n")
+        if invokeStats:
+            summary_f.write("Invocations: " + str(invokeStats["invocations"]) + ", Failures: " + str(invokeStats["failures"]) + ", Invoke Rate (invocations/s): " + str(invokeStats["invokeRate"]) + "\n")
+            summary_f.write("Invoke Latency Mean: " + str(invokeStats["meanLatencyMs"]) + ", Median: " + str(invokeStats["medianLatencyMs"]) + ", 99th Percentile: " + str(invokeStats["p99LatencyMs"]) + ", Max: " + str(invokeStats["maxLatencyMs"]) + "\n")
 
     # Task completion times, Compute & Observed (same plot)
     plt.clf()
@@ -238,17 +255,27 @@ def main():
         totalTime, internalTimes, externalTimes = job.getTasksTimes()
         
         path = r"./performanceData/concurrency" + str(concurrencyLimit) + "/trial" + str(trialNumber) + "/"
-        recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, path, totalTime)
+        recordPerformanceMetrics(internalTimes, externalTimes, concurrencyLimit, path, totalTime, job.getInvokeStats())
+        recordTaskTimings(job.getTaskTimings(), path)
+        with open(path + "failedTasks.txt", "w") as failed_f:
+            for reason in job.getFailedTasks().values():
+                failed_f.write(reason + "\n")
+        if job.getConcurrencyHistory():
+            with open(path + "concurrencyHistory.csv", "w") as history_f:
+                history_f.write("Time, ConcurrencyLimit\n")
+                for changeTime, limit in job.getConcurrencyHistory():
+                    history_f.write(str(changeTime) + ", " + str(limit) + "\n")
 
         # To verify results you will first need to obtain the SSW alignments by running SSW locally.
         # The resulting alignments need to be placed in ./results_basis.
         # You can obtain SSW alignments by running the scripts inside ./examples/proteinSequenceAlignment/preprocessing/
+        # The results are compared as they are streamed from S3, see verify_results.py.
         if verifyResults:
-	        trialResultsDir = path + "results/"
-	        basisResultsDir = "./results_basis/"
-	        downloadResults(s3ResultsBucket, trialResultsDir)
-	        verifyResults(basisResultsDir, trialResultsDir, path)
-        cleanup(s3ResultsBucket, sqsQueueUrl)
+            basisResultsDir = "./results_basis/"
+            diffs = verify_results.verifyResults(lc.AwsBackend(), s3ResultsBucket, basisResultsDir)
+            verify_results.writeReport(diffs, basisResultsDir, s3ResultsBucket, path + "verification.txt")
+        # Deletes the trial's results (in batches, see Job.cleanup) and any message left in the queue before the next trial.
+        job.cleanup(purgeQueue=True)
     print("Done")
 
 main()
\ No newline at end of file
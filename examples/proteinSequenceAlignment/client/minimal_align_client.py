@@ -5,54 +5,228 @@ Upon completion, results should be located in your S3 bucket.
 lambdaName = r"<AWS Lambda ARN>" #The ARN of the AWS Lambda function
 sqsQueueUrl = r"<SQS Queue Url>" #The URL of the AWS SQS Queue
 s3ResultsBucket = r"alignment-results" #The bucket name of the AWS S3 Bucket
+# runLocally - Whether the tasks should be run on this machine (see local_backend.py) instead of AWS.
+# sqsQueueUrl and s3ResultsBucket are then used as local directories and the partitions are read from ../lambdaPackage.
+runLocally = False
+localPackageDir = r"../lambdaPackage"
+# targetBatchDuration - When set (ms), small tasks are packed into batches run by a single Lambda (see lambda_client.createBatches).
+# estimatedCostPerMs is then the task size (KB^2) aligned per ms, see the rates recorded by metrics_align_client.py.
+targetBatchDuration = None
+estimatedCostPerMs = None
+# journalPath - Every launch and completion is appended here. Rerunning this client after an interruption
+# skips the tasks whose results are already in s3ResultsBucket.
+journalPath = r"./alignment.journal"
+# adaptiveConcurrency - Whether the number of concurrent Lambdas starts low and adapts (up to concurrencyLimit) to
+# throttling and the observed completion rate (see concurrency.py) instead of always being concurrencyLimit. The limit
+# grows slowly from its start (minutes to reach 1000), so this is for accounts whose Lambda concurrency is shared or lower
+# than concurrencyLimit; otherwise it lengthens the job.
+adaptiveConcurrency = False
+# useAlignmentEngine - Whether the partitions are aligned inside the Lambda's process by ssw_engine.py (libssw.so) instead of
+# by starting ssw_test for every task. ssw_engine.py, ssw_lib.py and libssw.so need to be in the Lambda package.
+useAlignmentEngine = False
+# symmetricDiagonal - With useAlignmentEngine, the diagonal tasks (a partition against itself) only align the upper triangle
+# of their protein pairs (see ssw_engine.py --symmetric), which nearly halves the largest tasks; skipIdentity also leaves
+# out each protein against itself. The other tasks are marked --deduplicated, so the job holds each pair of proteins once.
+symmetricDiagonal = False
+skipIdentity = False
+# usePartitionPackages - With useAlignmentEngine, the tasks read the partition packages (partitionN.sswp, built by
+# preprocessing/packPartitions.py and added to the Lambda package's proteinPartitions) instead of the FASTA partitions.
+usePartitionPackages = False
+# prefilterOptions - With useAlignmentEngine, when set (a list, ex. [] or ["--max-evalue", "0.1"]), the tasks only align the
+# protein pairs sharing enough seeds (see ssw_engine.py --prefilter, which needs numpy in the Lambda package) and write
+# binary hits (-b, see ssw/ssw_hits.py) instead of the score list of -l, which cannot leave out pairs. Measure the hits
+# this loses with ssw/prefilter_recall.py first.
+prefilterOptions = None
+# sourceFastaName - With useAlignmentEngine, the tasks align blocks of records of this (faidx indexed) FASTA file in the
+# Lambda package (ex. "uniprot_humanProteinList.fasta", with its .fai index, see preprocessing/indexProteins.py) instead of
+# the partitions. The blocks are cut when the job is created, from the index in this folder (./<sourceFastaName>.fai):
+# each holds about blockResidues residues, or, if targetTaskDuration (ms) is set, as many as estimatedCostPerMs says
+# two blocks are aligned in targetTaskDuration.
+sourceFastaName = None
+blockResidues = 250000
+targetTaskDuration = None
+# resultCacheBucket - When set, results are also kept in this bucket (a directory when runLocally) under a key derived from
+# the content of the task's inputs, the score matrix, the aligner and its arguments (see cache.py), and tasks whose result is
+# already there are not run again, in any later job. The keys are computed from the Lambda package contents in localPackageDir,
+# which must match the deployed package.
+resultCacheBucket = None
+resultCachePrefix = r"ssw/"
+# jobId - When set, the results are stored under "<jobId>/" in s3ResultsBucket, so several jobs can share the bucket and
+# each can be resumed, downloaded and cleaned up (see cleanup.py --job) on its own.
+jobId = None
 
 import lambda_client as lc
+import local_backend
+import cache
+import cleanup
+from concurrent.futures import ThreadPoolExecutor
 import pathlib
-import boto3
+import os
+import json
+import math
+
+# The location of the Lambda package contents, /var/task on AWS Lambda.
+packageRoot = os.path.abspath(localPackageDir) if runLocally else r"/var/task"
+
+# Returns the manifest written by partitionProteins.py next to the partitions (protein and residue counts of each partition),
+# or None if the partitions have no manifest.
+def loadPartitionManifest():
+    manifestPath = r"./proteinPartitions/manifest.json"
+    if not os.path.exists(manifestPath):
+        return None
+    with open(manifestPath, "r") as manifest_f:
+        return json.load(manifest_f)
+
+partitionManifest = loadPartitionManifest()
+
+# Returns the number of protein partitions.
+def getPartitionCount():
+    return len(partitionManifest["partitions"]) if partitionManifest else 41
+
+# Returns the size of the protein partition with the corresponding partitionNumber: thousands of residues from the manifest,
+# or the file size (KB) without one.
+def getPartitionSize(partitionNumber):
+    if partitionManifest:
+        return partitionManifest["partitions"][partitionNumber - 1]["residues"] / 1000.0
+    return os.path.getsize(r"./proteinPartitions/partition" + str(partitionNumber) + ".fasta") / 1000.0
+
+# The estimated cost of aligning two partitions, used to launch the largest tasks first.
+def getJobSize(partition1, partition2):
+    return getPartitionSize(partition1) * getPartitionSize(partition2)
+
+# Returns the residue count of every record of the faidx index at indexPath.
+def readRecordLengths(indexPath):
+    with open(indexPath, "r") as index_f:
+        return [int(line.split("\t")[1]) for line in index_f if line.strip()]
+
+# Returns the record ranges (first, last, residues; 1-based and inclusive) of contiguous blocks of about residuesPerBlock residues.
+def createBlocks(lengths, residuesPerBlock):
+    blocks = []
+    first = 1
+    residues = 0
+    for record, length in enumerate(lengths, 1):
+        residues += length
+        if residues >= residuesPerBlock or record == len(lengths):
+            blocks.append((first, record, residues))
+            first = record + 1
+            residues = 0
+    return blocks
+
+# Returns the number of residues per block: task cost is (thousands of residues)^2, see getJobSize.
+def getBlockResidues():
+    if targetTaskDuration and estimatedCostPerMs:
+        return 1000 * math.sqrt(targetTaskDuration * estimatedCostPerMs)
+    return blockResidues
+
+# Returns the cache key of the result of command (see cache.createCacheKey): the arguments, with the content of every Lambda
+# package file they name (read from localPackageDir), and the content of the aligner.
+def getCacheKey(command):
+    parts = []
+    for argument in command:
+        path = argument.split(":")[0] # Record ranges (path:first-last) are kept in the argument itself
+        for root in [packageRoot + r"/", r"./"]:
+            if path.startswith(root) and os.path.isfile(os.path.join(localPackageDir, path[len(root):])):
+                parts.append(cache.hashFile(os.path.join(localPackageDir, path[len(root):])))
+        parts.append(argument)
+    aligner = ["ssw_engine.py", "ssw_lib.py", "libssw.so"] if useAlignmentEngine else ["ssw_test"]
+    return cache.createCacheKey(parts + [cache.hashFile(os.path.join(localPackageDir, fileName)) for fileName in aligner])
+
+# Returns the Task aligning targetInput against queryInput; diagonal tells whether they are the same input.
+def createTask(targetInput, queryInput, name, cost, diagonal):
+    prefilter = useAlignmentEngine and prefilterOptions is not None
+    arguments = [
+        r"-pb" if prefilter else r"-pl",
+        targetInput,
+        queryInput,
+        r"./BLOSUM62",
+        r"-o 10",
+        r"-e 1"
+    ]
+    symmetric = useAlignmentEngine and symmetricDiagonal and diagonal
+    if prefilter:
+        arguments += ["--prefilter"] + prefilterOptions
+    if useAlignmentEngine and symmetricDiagonal:
+        arguments += (["--symmetric"] + (["--skip-identity"] if skipIdentity else [])) if symmetric else ["--deduplicated"]
+    command = arguments if useAlignmentEngine else [r"/tmp/ssw_test"] + arguments
+    return lc.Task(
+        command=command,
+        name=name,
+        executableName="ssw_test",
+        lambdaFunctionName=lambdaName,
+        cost=cost / 2 if symmetric else cost,
+        entryPoint="ssw_engine:alignTask" if useAlignmentEngine else None,
+        cacheKey=getCacheKey(command) if resultCacheBucket else None
+    )
+
+# Returns the tasks aligning every pair of record blocks of sourceFastaName (see ssw_engine.py's path:first-last inputs).
+# A task is named after its record ranges, ex. "1-480x481-1013".
+def createBlockTasks():
+    blocks = createBlocks(readRecordLengths(r"./" + sourceFastaName + ".fai"), getBlockResidues())
+    sourcePath = packageRoot + r"/" + sourceFastaName
+    tasks = set()
+    for i, (firstI, lastI, residuesI) in enumerate(blocks):
+        for firstJ, lastJ, residuesJ in blocks[i:]:
+            tasks.add(createTask(
+                sourcePath + ":" + str(firstI) + "-" + str(lastI),
+                sourcePath + ":" + str(firstJ) + "-" + str(lastJ),
+                name=str(firstI) + "-" + str(lastI) + "x" + str(firstJ) + "-" + str(lastJ),
+                cost=residuesI / 1000.0 * residuesJ / 1000.0,
+                diagonal=firstI == firstJ
+            ))
+    return tasks
 
 def createTasks():
-    totalPartitions = 41
+    if useAlignmentEngine and sourceFastaName:
+        return createBlockTasks()
+    totalPartitions = getPartitionCount()
+    extension = ".sswp" if useAlignmentEngine and usePartitionPackages else ".fasta"
     tasks = set()
     for i in range(1, totalPartitions + 1):
         for j in range(i, totalPartitions + 1):
-            tasks.add(lc.Task(
-                command=[
-                    r"/tmp/ssw_test",
-                    r"-pl",
-                    r"/var/task/proteinPartitions/partition" + str(i) + ".fasta",
-                    r"/var/task/proteinPartitions/partition" + str(j) + ".fasta",
-                    r"./BLOSUM62",
-                    r"-o 10",
-                    r"-e 1"
-                ],
+            tasks.add(createTask(
+                packageRoot + r"/proteinPartitions/partition" + str(i) + extension,
+                packageRoot + r"/proteinPartitions/partition" + str(j) + extension,
                 name=str(i) + "-" + str(j),
-                executableName="ssw_test",
-                lambdaFunctionName=lambdaName
-                )
-            )
+                cost=getJobSize(i, j),
+                diagonal=i == j
+            ))
     return tasks
 
 def createJob(concurrencyLimit):
+    tasks = createTasks()
+    if targetBatchDuration:
+        tasks = lc.createBatches(tasks, targetBatchDuration, estimatedCostPerMs)
     job = lc.Job(
-        tasks=createTasks(),
+        tasks=tasks,
         concurrencyLimit=concurrencyLimit,
         sqsQueueUrl=sqsQueueUrl,
-        s3Bucket=s3ResultsBucket
+        s3Bucket=s3ResultsBucket,
+        backend=local_backend.LocalBackend(localPackageDir) if runLocally else None,
+        journalPath=journalPath,
+        resume=True,
+        controller=lc.ConcurrencyController(maxLimit=concurrencyLimit) if adaptiveConcurrency and not runLocally else None,
+        cache=cache.ResultCache(resultCacheBucket, resultCachePrefix) if resultCacheBucket else None,
+        resultPrefix=cleanup.getJobPrefix(jobId) if jobId else ""
     )
     return job
 
-def downloadResults(s3Bucket, resultsPath):
+# Downloads (and decompresses) all results in s3Bucket starting with prefix to resultsPath (without the prefix), workers results at a time.
+def downloadResults(s3Bucket, resultsPath, workers=32, prefix=""):
     pathlib.Path(resultsPath).mkdir(parents=True, exist_ok=True)
-    my_bucket = boto3.resource('s3').Bucket(s3Bucket)
+    backend = lc.AwsBackend(transferWorkers=workers)
 
-    for object in my_bucket.objects.all():
-        my_bucket.download_file(object.key, resultsPath + object.key)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda key: backend.downloadResult(s3Bucket, key, resultsPath + key[len(prefix):]), backend.listResults(s3Bucket, prefix)))
 
 def main():
-    concurrencyLimit = 1000
+    concurrencyLimit = os.cpu_count() if runLocally else 1000
     job = createJob(concurrencyLimit)
     print("Starting tasks")
     job.executeAllTasks()
+    for reason in job.getFailedTasks().values():
+        print(reason)
+    if job.getConcurrencyHistory():
+        print("Concurrency limit settled at", job.getConcurrencyHistory()[-1][1])
     print("Done")
 
 main()
\ No newline at end of file
@@ -1,17 +1,13 @@
 """
-Deletes all files in the the bucket with the specified name.
-This assumes that there are no folders in the specified bucket.
+Deletes all files in the the bucket with the specified name, or only those starting with prefix (ex. the results of one
+job, see jobId in minimal_align_client.py). Files are deleted in requests of up to 1000 keys sent in parallel, see cleanup.py.
 """
 
-import os
-import boto3
-import threading
+import lambda_client as lc
+import cleanup
 
 bucket = "alignment-results" # The S3 bucket to delete all files in.
-my_bucket = boto3.resource('s3').Bucket(bucket)
+prefix = "" # Only files starting with prefix are deleted, ex. cleanup.getJobPrefix(jobId).
 
-for object in my_bucket.objects.all():
-    boto3.client("s3").delete_object(
-        Bucket=bucket,
-        Key=object.key
-    )
+deleted = cleanup.cleanBucket(lc.AwsBackend(), bucket, prefix)
+print("Deleted " + str(deleted) + " files from [" + bucket + "]")
@@ -0,0 +1,113 @@
+"""
+Contains the policies which decide in which order a Job launches its tasks, and a simulator which reports the
+makespan each policy would give on a recorded trace.
+
+A policy is any object with an order(tasks) method returning the tasks as a list in launch order.
+Tasks are ordered by their cost attribute, an estimate of their run time in arbitrary units (ex. partition size product).
+
+Simulation usage (completionTimes.csv as written by metrics_align_client.py):
+    python3 scheduling.py completionTimes.csv <concurrencyLimit>
+"""
+import sys
+import csv
+import heapq
+import random
+from collections import namedtuple
+
+# A task of a recorded trace: duration (ms) is what it took, cost is the estimate the policies see.
+TraceTask = namedtuple("TraceTask", ["name", "cost", "duration"])
+
+def _costOf(task):
+    return task.cost if task.cost is not None else 0
+
+class LongestFirstPolicy:
+    """
+    Longest-processing-time-first: the most expensive tasks are launched first so they don't end up setting the makespan.
+    """
+    name = "longest-first"
+
+    def order(self, tasks):
+        return sorted(tasks, key=lambda task: (-_costOf(task), task.name))
+
+class ShortestFirstPolicy:
+    """
+    Shortest-processing-time-first: the cheapest tasks are launched first.
+    """
+    name = "shortest-first"
+
+    def order(self, tasks):
+        return sorted(tasks, key=lambda task: (_costOf(task), task.name))
+
+class ArbitraryPolicy:
+    """
+    Launches the tasks in the iteration order of the task set (the original behavior of Job).
+    """
+    name = "arbitrary"
+
+    def order(self, tasks):
+        return list(tasks)
+
+class RandomPolicy:
+    """
+    Launches the tasks in a random order.
+
+    Attributes:
+        seed: Seed of the random generator, for reproducible orders.
+    """
+    name = "random"
+
+    def __init__(self, seed=None):
+        self.seed = seed
+
+    def order(self, tasks):
+        orderedTasks = sorted(tasks, key=lambda task: task.name)
+        random.Random(self.seed).shuffle(orderedTasks)
+        return orderedTasks
+
+def simulateMakespan(traceTasks, concurrencyLimit, policy, startOverhead=0):
+    """
+    Returns the makespan (ms) of running traceTasks (TraceTasks) with at most concurrencyLimit at a time, launched in the order given by policy.
+    Each task is started as soon as a slot frees up; startOverhead (ms) is added to every task's duration.
+    """
+    slots = [0] * min(concurrencyLimit, len(traceTasks)) # Time at which each slot becomes free
+    makespan = 0
+    for task in policy.order(traceTasks):
+        startTime = heapq.heappop(slots)
+        endTime = startTime + startOverhead + task.duration
+        makespan = max(makespan, endTime)
+        heapq.heappush(slots, endTime)
+    return makespan
+
+def readTrace(tracePath):
+    """
+    Reads the TraceTasks from a completionTimes.csv file (columns TaskName, TaskNumber, InternalCompletionTime, ExternalCompletionTime, TaskSize).
+    The compute (internal) time is used as the duration and the task size as the cost.
+    """
+    traceTasks = []
+    with open(tracePath, "r") as trace_f:
+        for row in csv.DictReader(trace_f, skipinitialspace=True):
+            traceTasks.append(TraceTask(row["TaskName"], float(row["TaskSize"]), float(row["InternalCompletionTime"])))
+    return traceTasks
+
+def comparePolicies(traceTasks, concurrencyLimit, policies=None, startOverhead=0):
+    """
+    Returns a list of (policy name, makespan) for each of the policies (all policies in this file by default).
+    """
+    if policies is None:
+        policies = [LongestFirstPolicy(), ShortestFirstPolicy(), ArbitraryPolicy(), RandomPolicy(seed=0)]
+    return [(policy.name, simulateMakespan(traceTasks, concurrencyLimit, policy, startOverhead)) for policy in policies]
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 scheduling.py <completionTimes.csv> <concurrencyLimit> [startOverheadMs]")
+        sys.exit(1)
+    traceTasks = readTrace(sys.argv[1])
+    concurrencyLimit = int(sys.argv[2])
+    startOverhead = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    lowerBound = max(sum(task.duration for task in traceTasks) / concurrencyLimit, max(task.duration for task in traceTasks))
+    print("Tasks: " + str(len(traceTasks)) + ", Concurrency Limit: " + str(concurrencyLimit) + ", Makespan Lower Bound (ms): " + str(lowerBound))
+    for policyName, makespan in comparePolicies(traceTasks, concurrencyLimit, startOverhead=startOverhead):
+        print(policyName + ": " + str(makespan) + " ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Checks the results of an alignment job against a baseline (see preprocessing/alignProteins.py) by their alignments instead of
+their bytes: every result is streamed from the bucket, decompressed and parsed as it arrives (nothing is written to disk),
+workers results at a time, and its alignment records are compared with the baseline's. Formatting differences (spacing,
+record order, compression) are not reported; differing scores, coordinates and missing or extra alignments are, per task.
+
+Supported result formats (recognized from their content):
+ - score lists (ssw_test -pl, ssw_engine.py -pl): the scores of all query/target pairs, compared by position.
+ - alignment records (ssw_test, pyssw.py or ssw_engine.py without -l): compared by query and target names.
+ - binary hits (-b, see ssw/ssw_hits.py): compared by query and target indices.
+The baseline of task "i-j" is <basisPath>i-j or <basisPath>alignmenti-j (the name alignProteins.py uses).
+
+Usage (--local reads the results from a local bucket directory, see local_backend.py):
+    python3 verify_results.py <basisPath> <s3Bucket> [reportPath] [--local]
+"""
+import os
+import sys
+import time
+import struct
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from results import iterateResult
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ssw"))
+import ssw_hits
+
+RECORD_FIELDS = ["optimal_alignment_score", "suboptimal_alignment_score", "strand", "target_begin", "target_end", "query_begin", "query_end"]
+exampleCount = 5 # Number of differing records listed per task
+
+# Yields the parts of the data read in chunks which are separated by separator (the last part may be empty).
+def splitChunks(chunks, separator):
+    rest = b""
+    for chunk in chunks:
+        parts = (rest + chunk).split(separator)
+        rest = parts.pop()
+        for part in parts:
+            yield part
+    yield rest
+
+# Returns (format, chunks) of the result content read in chunks: format is "hits", "records" or "scores" and chunks
+# yields the whole content again.
+def detectFormat(chunks):
+    first = b""
+    for chunk in chunks:
+        first += chunk
+        if len(first) >= len(ssw_hits.HIT_MAGIC):
+            break
+    chunks = itertools.chain([first], chunks)
+    if first.startswith(ssw_hits.HIT_MAGIC):
+        return "hits", chunks
+    if first.lstrip().startswith(b"target_name:"):
+        return "records", chunks
+    return "scores", chunks
+
+# Yields the scores of a score list (comma separated).
+def parseScores(chunks):
+    for token in splitChunks(chunks, b","):
+        token = token.strip()
+        if token:
+            yield int(token)
+
+# Yields ((query name, target name), (score, suboptimal score, strand, coordinates...)) for each alignment record.
+# The alignment drawings of ssw_test -c are not compared: the coordinates already locate the alignment.
+def parseRecords(chunks):
+    names = {}
+    fields = None
+    for line in splitChunks(chunks, b"\n"):
+        line = line.decode().strip()
+        if line.startswith("target_name:") or line.startswith("query_name:"):
+            if fields is not None:
+                yield (names.get("query_name"), names.get("target_name")), tuple(fields.get(field) for field in RECORD_FIELDS)
+                names = {}
+                fields = None
+            key, _, value = line.partition(":")
+            names[key] = value.strip()
+        elif line.startswith("optimal_alignment_score:"):
+            fields = {}
+            for pair in line.split("\t"):
+                key, _, value = pair.partition(":")
+                fields[key.strip()] = value.strip()
+    if fields is not None:
+        yield (names.get("query_name"), names.get("target_name")), tuple(fields.get(field) for field in RECORD_FIELDS)
+
+# Yields ((query index, target index), (score, suboptimal score, coordinates..., flags)) for each binary hit, parsing the
+# records as the chunks arrive. Where the records end is only written in the footer, so a record is yielded once enough
+# data follows it to rule out that it is part of the CIGAR section: if record i were not a record, the file would end
+# within the CIGARs of the records before it (and the footer). At most the size of those CIGARs is held back (only the
+# footer for hits without CIGARs); the records left at the end are counted from the footer.
+def parseHits(chunks):
+    headerSize = struct.calcsize(ssw_hits.HEADER_FORMAT)
+    footerSize = struct.calcsize(ssw_hits.FOOTER_FORMAT)
+    record = struct.Struct(ssw_hits.RECORD_FORMAT)
+    data = bytearray()
+    start = headerSize # Offset in data of the next record
+    received = 0
+    recordCount = 0 # Records yielded...
+    cigarCount = 0 # ... and the number of their CIGAR operations
+    for chunk in chunks:
+        data += chunk
+        received += len(chunk)
+        while len(data) - start >= record.size and received > headerSize + recordCount * record.size + 4 * cigarCount + footerSize:
+            values = record.unpack_from(data, start)
+            start += record.size
+            recordCount += 1
+            cigarCount += values[9]
+            yield (values[0], values[1]), values[2:8] + values[10:]
+        if start > 1 << 20:
+            del data[:start]
+            start = 0
+    if received < headerSize + footerSize:
+        raise ValueError("The binary hits are truncated.")
+    totalRecords, totalCigars, endMagic = struct.unpack(ssw_hits.FOOTER_FORMAT, bytes(data[len(data) - footerSize:]))
+    if endMagic != ssw_hits.END_MAGIC or received != headerSize + totalRecords * record.size + 4 * totalCigars + footerSize:
+        raise ValueError("The binary hits are truncated or were written by an incompatible version.")
+    for values in record.iter_unpack(bytes(data[start:start + (totalRecords - recordCount) * record.size])):
+        yield (values[0], values[1]), values[2:8] + values[10:]
+
+class TaskDiff:
+    """
+    The differences between the result of a task and its baseline.
+
+    Attributes:
+        taskName: Name of the task (the result's key).
+        records: Number of alignment records (or scores) of the result.
+        missing: Number of baseline records not in the result.
+        extra: Number of result records not in the baseline.
+        changed: Number of records whose score or coordinates differ from the baseline.
+        examples: Descriptions of the first (at most exampleCount) differing records.
+        error: Why the result could not be compared (no baseline, unreadable, different formats), or None.
+    """
+    def __init__(self, taskName):
+        self.taskName = taskName
+        self.records = 0
+        self.missing = 0
+        self.extra = 0
+        self.changed = 0
+        self.examples = []
+        self.error = None
+
+    def isIdentical(self):
+        return self.error is None and self.missing == 0 and self.extra == 0 and self.changed == 0
+
+    def addExample(self, description):
+        if len(self.examples) < exampleCount:
+            self.examples.append(description)
+
+    def describe(self):
+        if self.error:
+            return self.taskName + ": " + self.error
+        summary = (self.taskName + ": " + str(self.records) + " records, " + str(self.missing) + " missing, " + str(self.extra) +
+                   " extra, " + str(self.changed) + " changed")
+        return "\n    ".join([summary] + self.examples)
+
+# Compares score lists position by position, reading both at once.
+def compareScores(diff, chunks, basisChunks):
+    for position, (score, basisScore) in enumerate(itertools.zip_longest(parseScores(chunks), parseScores(basisChunks))):
+        if score is None:
+            diff.missing += 1
+            diff.addExample("score " + str(position) + ": missing (baseline " + str(basisScore) + ")")
+            continue
+        diff.records += 1
+        if basisScore is None:
+            diff.extra += 1
+            diff.addExample("score " + str(position) + ": extra (" + str(score) + ")")
+        elif score != basisScore:
+            diff.changed += 1
+            diff.addExample("score " + str(position) + ": " + str(score) + " (baseline " + str(basisScore) + ")")
+
+# Compares records by pair: the baseline is indexed, then the result is streamed against it.
+def compareRecords(diff, records, basisRecords):
+    expected = {}
+    for pair, values in basisRecords:
+        expected.setdefault(pair, []).append(values)
+    for pair, values in records:
+        diff.records += 1
+        candidates = expected.get(pair)
+        if not candidates:
+            diff.extra += 1
+            diff.addExample(str(pair) + ": extra " + str(values))
+        elif values in candidates:
+            candidates.remove(values)
+        else:
+            diff.changed += 1
+            diff.addExample(str(pair) + ": " + str(values) + " (baseline " + str(candidates[0]) + ")")
+            candidates.pop(0)
+    for pair, candidates in expected.items():
+        for values in candidates:
+            diff.missing += 1
+            diff.addExample(str(pair) + ": missing " + str(values))
+
+# Returns the path of the baseline of taskName in basisPath, or None if there is none.
+def findBasis(basisPath, taskName):
+    for name in [taskName, "alignment" + taskName]:
+        if os.path.isfile(os.path.join(basisPath, name)):
+            return os.path.join(basisPath, name)
+    return None
+
+# Returns the TaskDiff of the result key in s3Bucket (the result of the task key without prefix) against its baseline in basisPath.
+def verifyResult(backend, s3Bucket, key, basisPath, prefix=""):
+    diff = TaskDiff(key[len(prefix):])
+    basis = findBasis(basisPath, diff.taskName)
+    if basis is None:
+        diff.error = "no baseline in [" + basisPath + "]"
+        return diff
+    source = None
+    try:
+        source = backend.openResult(s3Bucket, key)
+        with open(basis, "rb") as basis_f:
+            resultFormat, chunks = detectFormat(iterateResult(source))
+            basisFormat, basisChunks = detectFormat(iterateResult(basis_f))
+            if resultFormat != basisFormat:
+                diff.error = "the result has " + resultFormat + ", the baseline has " + basisFormat
+            elif resultFormat == "scores":
+                compareScores(diff, chunks, basisChunks)
+            else:
+                parse = parseHits if resultFormat == "hits" else parseRecords
+                compareRecords(diff, parse(chunks), parse(basisChunks))
+    except Exception as e:
+        diff.error = "could not be compared: " + repr(e)
+    finally:
+        if source is not None:
+            source.close()
+    return diff
+
+def verifyResults(backend, s3Bucket, basisPath, workers=32, prefix=""):
+    """
+    Compares every result in s3Bucket starting with prefix (ex. a Job's resultPrefix) with its baseline in basisPath, workers
+    results at a time. Returns a list of TaskDiffs, including one (with an error) for every baseline without a result.
+    The backend needs at least workers pooled connections (see AwsBackend's transferWorkers).
+    """
+    keys = sorted(backend.listResults(s3Bucket, prefix))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        diffs = list(executor.map(lambda key: verifyResult(backend, s3Bucket, key, basisPath, prefix), keys))
+    baselines = set(name[len("alignment"):] if name.startswith("alignment") else name
+                    for name in os.listdir(basisPath) if not name.endswith(".part"))
+    for taskName in sorted(baselines - set(key[len(prefix):] for key in keys)):
+        diff = TaskDiff(taskName)
+        diff.error = "no result in [" + s3Bucket + "]"
+        diffs.append(diff)
+    return diffs
+
+# Writes the verification report of diffs to reportPath (standard output if None). Returns whether all results were identical.
+def writeReport(diffs, basisPath, s3Bucket, reportPath=None):
+    different = [diff for diff in diffs if not diff.isIdentical()]
+    lines = []
+    if different:
+        lines.append("Basis results at [" + basisPath + "] were DIFFERENT (INCORRECT) from trial results in [" + s3Bucket + "]: " +
+                     str(len(different)) + " of " + str(len(diffs)) + " tasks differ")
+        lines += [diff.describe() for diff in different]
+    else:
+        lines.append("Basis results at [" + basisPath + "] were IDENTICAL (CORRECT) to trial results in [" + s3Bucket + "]: " +
+                     str(len(diffs)) + " tasks, " + str(sum(diff.records for diff in diffs)) + " records")
+    if reportPath:
+        with open(reportPath, "w") as output_f:
+            output_f.write("\n".join(lines) + "\n")
+    else:
+        print("\n".join(lines))
+    return not different
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--local"]
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    if "--local" in sys.argv:
+        import local_backend
+        backend = local_backend.LocalBackend(".")
+    else:
+        import lambda_client
+        backend = lambda_client.AwsBackend()
+    startTime = time.time()
+    identical = writeReport(verifyResults(backend, args[1], args[0]), args[0], args[1], args[2] if len(args) > 2 else None)
+    print("Verified in " + str(round(time.time() - startTime, 2)) + " s")
+    sys.exit(0 if identical else 2)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,64 @@
 """
 Contains the code which needs to be uploaded to AWS Lambda.
 The entry point of the Lambda needs to be the handler(event, context) function contained here.
+When the event contains "backend": "local" (see local_backend.py) the S3 bucket and SQS queue url
+are local directories instead, which lets the same handler run on a local machine.
+
+Everything which does not depend on the event (boto3 clients, prepared executables) is created once per Lambda
+container and kept in module-level state, so warm invocations reuse it. Every completion message carries the
+cold/warm flag and the timings of the task's phases (see markComplete).
+
+The output of a task is not written to /tmp/: it is compressed (gzip, or zstd when the zstandard package is included
+in the Lambda package) and uploaded while the process runs, so the upload overlaps the computation and the result
+size is not limited by /tmp/.
+
+A task with an entryPoint ("module:function") is run in the Lambda's own process instead of starting an executable:
+the module is imported from the Lambda package once per container and function(command, output_f) writes the output
+to output_f, a binary file which is streamed to S3 like the output of an executable.
 """
+import time
+_moduleLoadStart = time.time()
 from pathlib import Path
-from shutil import copyfile
+from shutil import copyfile, copyfileobj
 import stat
 import os
+import sys
 import subprocess
+import tempfile
+import threading
+import importlib
+import zlib
 import boto3
-from boto3.s3.transfer import S3Transfer
-import time
 import json
+import uuid
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# State kept for the lifetime of the Lambda container (reused by warm invocations).
+_clients = {} # service name - boto3 client
+_preparedExecutables = set() # Executables already copied to /tmp/ and made executable
+_entryPoints = {} # "module:function" - function, for tasks run in-process
+_coldStart = True # True until the first invocation of this container has started
+_initDuration = int(round((time.time() - _moduleLoadStart) * 1000)) # Time (ms) it took to load this module
+
+# Returns the boto3 client for serviceName, creating it on first use.
+def getClient(serviceName):
+    if serviceName not in _clients:
+        _clients[serviceName] = boto3.client(serviceName)
+    return _clients[serviceName]
+
+# Returns the number of ms elapsed since startTime (seconds, time.time()).
+def elapsedMs(startTime):
+    return int(round((time.time() - startTime) * 1000))
 
 # Prepares the executable/script for execution by copying into /tmp/ folder and
-# adding execution permission.
+# adding execution permission. Done only once per container for each executable.
 def prepareExecutable(executableName):
+    if executableName in _preparedExecutables:
+        return
     destination = "/tmp/" + executableName
     if Path(destination).is_file():
         # File is already there - no need to copy
@@ -25,52 +69,255 @@ def prepareExecutable(executableName):
     if not os.access(destination, os.X_OK):
         st = os.stat(destination)
         os.chmod(destination, st.st_mode | stat.S_IEXEC)
+    _preparedExecutables.add(executableName)
+
+# Returns the function named by entryPoint ("module:function"), importing its module from the Lambda package on first use.
+def loadEntryPoint(entryPoint):
+    if entryPoint not in _entryPoints:
+        moduleName, functionName = entryPoint.split(":")
+        packageDir = os.path.dirname(os.path.abspath(__file__))
+        if packageDir not in sys.path:
+            sys.path.insert(0, packageDir)
+        _entryPoints[entryPoint] = getattr(importlib.import_module(moduleName), functionName)
+    return _entryPoints[entryPoint]
 
-# Peforms the tasks specified by the command and captures the output in file resultFileName. The file is then uploaded to the s3Bucket
-def performTask(command, resultFileName, s3Bucket):
-    with open(r"/tmp/" + resultFileName, "w") as output_f:
-        p = subprocess.Popen(command, stdin=None, stdout=output_f, stderr=subprocess.PIPE, universal_newlines=True)
-        (stdout_text, stderr_text) = p.communicate()
-        print("stderr_text = ", stderr_text)
-    # Uploaded Results
-    transfer = S3Transfer(boto3.client("s3"))
-    transfer.upload_file(r"/tmp/" + resultFileName, s3Bucket, resultFileName)
-
-# Marks this job complete by sending a SQS message.
-def markComplete(taskName, startTime, queueUrl):
-    sqs = boto3.client('sqs')
+# Returns a compressor (an object with compress(data) and flush()) for compression ("gzip", "zstd" or "none")
+# and the content encoding of its output. Returns (None, None) for "none".
+def createCompressor(compression):
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not available, compressing with gzip instead.")
+        compression = "gzip"
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS), "gzip"
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compressobj(), "zstd"
+    return None, None
+
+class CompressedStream:
+    """
+    A readable file-like object returning the compressed data read from source (ex. the stdout of a running process).
+    Compression happens as the data is read, so the upload reading this stream proceeds while the process produces its output.
+
+    Attributes:
+        rawBytes: Number of bytes read from source so far.
+        compressedBytes: Number of bytes returned so far.
+    """
+    def __init__(self, source, compressor, onEnd=None, chunkSize=1 << 20):
+        self.rawBytes = 0
+        self.compressedBytes = 0
+        self.__source = source
+        self.__compressor = compressor
+        self.__onEnd = onEnd # Called once source is exhausted; may raise to abort the upload.
+        self.__chunkSize = chunkSize
+        self.__buffer = bytearray()
+        self.__ended = False
+
+    def __fill(self):
+        chunk = self.__source.read(self.__chunkSize)
+        if not chunk:
+            if self.__compressor:
+                self.__buffer += self.__compressor.flush()
+            self.__ended = True
+            if self.__onEnd:
+                self.__onEnd()
+            return
+        self.rawBytes += len(chunk)
+        self.__buffer += self.__compressor.compress(chunk) if self.__compressor else chunk
+
+    def read(self, size=-1):
+        while not self.__ended and (size is None or size < 0 or len(self.__buffer) < size):
+            self.__fill()
+        if size is None or size < 0:
+            size = len(self.__buffer)
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        self.compressedBytes += len(data)
+        return data
+
+# Stores the data read from stream as key in s3Bucket. On S3 this is a multipart upload whose parts are sent while
+# the stream is still being read. If reading the stream fails nothing is stored. For the local backend s3Bucket is a directory.
+def uploadStream(stream, s3Bucket, key, contentEncoding, backend):
+    if backend == "local":
+        destination = os.path.join(s3Bucket, key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        try:
+            with open(destination + ".part", "wb") as result_f:
+                copyfileobj(stream, result_f, 1 << 20)
+        except Exception:
+            os.remove(destination + ".part")
+            raise
+        os.replace(destination + ".part", destination)
+    else:
+        extraArgs = {"ContentEncoding": contentEncoding} if contentEncoding else None
+        getClient("s3").upload_fileobj(stream, s3Bucket, key, ExtraArgs=extraArgs)
+
+# Sends a message to queueUrl. For the local backend queueUrl is a directory and each message is a .json file in it.
+def sendMessage(queueUrl, messageAttributes, messageBody, backend):
+    if backend == "local":
+        messageId = str(uuid.uuid4())
+        messagePath = os.path.join(queueUrl, messageId)
+        with open(messagePath + ".tmp", "w") as message_f:
+            json.dump({"MessageId": messageId, "MessageAttributes": messageAttributes, "Body": messageBody}, message_f)
+        # The rename makes the message visible to receivers only once it is completely written.
+        os.replace(messagePath + ".tmp", messagePath + ".json")
+    else:
+        getClient("sqs").send_message(
+            QueueUrl=queueUrl,
+            DelaySeconds=0,
+            MessageAttributes=messageAttributes,
+            MessageBody=messageBody
+        )
+
+# Peforms the tasks specified by the command and streams its output, compressed, to resultFileName in the s3Bucket.
+# If timings (dict) is given, the duration (ms) of the execution and the remaining upload time after the process exited are
+# stored in it as "execute" and "upload", and the size of the output before and after compression as "outputBytes" and "storedBytes".
+def performTask(command, resultFileName, s3Bucket, backend="aws", timings=None, compression="none"):
+    timings = timings if timings is not None else {}
+    phaseStart = time.time()
+    compressor, contentEncoding = createCompressor(compression)
+    with tempfile.TemporaryFile(dir="/tmp") as stderr_f:
+        p = subprocess.Popen(command, stdin=None, stdout=subprocess.PIPE, stderr=stderr_f)
+
+        # Runs when the output is exhausted. Failing here aborts the upload, so a failed task leaves no result behind.
+        def checkExit():
+            returnCode = p.wait()
+            timings["execute"] = elapsedMs(phaseStart)
+            stderr_f.seek(0)
+            stderr_text = stderr_f.read().decode("utf-8", "replace")
+            print("stderr_text = ", stderr_text)
+            if returnCode != 0:
+                raise RuntimeError("Command exited with code " + str(returnCode) + ": " + stderr_text)
+
+        stream = CompressedStream(p.stdout, compressor, checkExit)
+        try:
+            uploadStream(stream, s3Bucket, resultFileName, contentEncoding, backend)
+        finally:
+            p.stdout.close()
+            p.wait()
+    timings["upload"] = elapsedMs(phaseStart) - timings["execute"]
+    timings["outputBytes"] = stream.rawBytes
+    timings["storedBytes"] = stream.compressedBytes
+
+# Like performTask, but calls the function named by entryPoint as function(args, output_f) in this process.
+# The function runs in a thread writing into a pipe, so its output is compressed and uploaded while it runs.
+def performInProcess(entryPoint, args, resultFileName, s3Bucket, backend="aws", timings=None, compression="none"):
+    timings = timings if timings is not None else {}
+    function = loadEntryPoint(entryPoint)
+    phaseStart = time.time()
+    compressor, contentEncoding = createCompressor(compression)
+    readFd, writeFd = os.pipe()
+    errors = []
+
+    def run():
+        try:
+            with os.fdopen(writeFd, "wb") as output_f:
+                function(args, output_f)
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+
+    # Runs when the output is exhausted. Failing here aborts the upload, so a failed task leaves no result behind.
+    def checkEnd():
+        worker.join()
+        timings["execute"] = elapsedMs(phaseStart)
+        if errors:
+            raise RuntimeError(entryPoint + " failed: " + repr(errors[0]))
+
+    with os.fdopen(readFd, "rb") as source:
+        stream = CompressedStream(source, compressor, checkEnd)
+        try:
+            uploadStream(stream, s3Bucket, resultFileName, contentEncoding, backend)
+        finally:
+            source.close() # Stops the function (broken pipe) if the upload failed
+            worker.join()
+    timings["upload"] = elapsedMs(phaseStart) - timings["execute"]
+    timings["outputBytes"] = stream.rawBytes
+    timings["storedBytes"] = stream.compressedBytes
+
+# Marks this job complete by sending a SQS message. If error is given the task is reported as failed.
+# timings (dict) is sent as JSON in the Timings attribute: whether the container was cold, its init duration and the phase durations (ms).
+# The time of the notification itself is measured by the client, as the time between EndTime and the message's arrival.
+# attemptId (sent by the client with each launch) is returned in the Attempt attribute so that the client can tell the attempts apart.
+def markComplete(taskName, startTime, queueUrl, backend="aws", error=None, timings=None, attemptId=None):
     endTime = int(round(time.time() * 1000))
+    if error is None:
+        status = "Succeeded"
+        messageBody = "Task " + taskName + " took a total of " + str((endTime - startTime) / 1000.0) + " seconds to complete."
+    else:
+        status = "Failed"
+        messageBody = "Task " + taskName + " failed: " + error[:1000]
 
-    response = sqs.send_message(
-        QueueUrl=queueUrl,
-        DelaySeconds=0,
-        MessageAttributes={
-            "TaskName": {
-                "DataType": "String",
-                "StringValue": taskName
-            },
-            "StartTime": {
-                "DataType": "Number",
-                "StringValue": str(startTime)
-            },
-            "EndTime": {
-                "DataType": "Number",
-                "StringValue": str(endTime)
-            }
+    messageAttributes = {
+        "TaskName": {
+            "DataType": "String",
+            "StringValue": taskName
         },
-        MessageBody=(
-            "Task " + taskName + " took a total of " + str((endTime - startTime) / 1000.0) + " seconds to complete."
-        )
-    )
+        "StartTime": {
+            "DataType": "Number",
+            "StringValue": str(startTime)
+        },
+        "EndTime": {
+            "DataType": "Number",
+            "StringValue": str(endTime)
+        },
+        "Status": {
+            "DataType": "String",
+            "StringValue": status
+        },
+        "Timings": {
+            "DataType": "String",
+            "StringValue": json.dumps(timings if timings is not None else {})
+        }
+    }
+    if attemptId is not None:
+        messageAttributes["Attempt"] = {
+            "DataType": "String",
+            "StringValue": attemptId
+        }
+    sendMessage(queueUrl, messageAttributes, messageBody, backend)
 
-def handler(event, context):
+# Runs a single task (taskName, executableName or entryPoint, command) and reports its completion.
+# The result is stored as resultKey (the task name if the event has none, ex. from an older client).
+# coldStart tells whether the task is the first one run by this container.
+def runTask(task, s3Bucket, queueUrl, backend, coldStart=False, attemptId=None):
     startTime = int(round(time.time() * 1000))
+    timings = {"cold": coldStart, "initDuration": _initDuration if coldStart else 0}
+
+    print(task["command"])
 
+    error = None
+    try:
+        phaseStart = time.time()
+        if task.get("entryPoint"):
+            loadEntryPoint(task["entryPoint"])
+            timings["prepare"] = elapsedMs(phaseStart)
+            performInProcess(task["entryPoint"], task["command"], task.get("resultKey", task["taskName"]), s3Bucket, backend, timings, task.get("compression", "none"))
+        else:
+            prepareExecutable(task["executableName"])
+            timings["prepare"] = elapsedMs(phaseStart)
+            performTask(task["command"], task.get("resultKey", task["taskName"]), s3Bucket, backend, timings, task.get("compression", "none"))
+    except Exception as e:
+        # Reported so the client can retry the task instead of waiting for it.
+        print("Task " + task["taskName"] + " failed:", repr(e))
+        error = repr(e)
+    phaseStart = time.time()
+    markComplete(task["taskName"], startTime, queueUrl, backend, error, timings, attemptId)
+    print("Task " + task["taskName"] + " timings (ms):", json.dumps(timings), "notify:", elapsedMs(phaseStart))
+
+# The event is either a single task or a batch: {"tasks": [task, task, ...], "sqsQueueUrl": ..., "s3Bucket": ...}.
+# Each task of a batch is run in turn and reports its own completion.
+def handler(event, context):
+    global _coldStart
+    coldStart = _coldStart
+    _coldStart = False
     print(json.dumps(event, indent=4, sort_keys=True))
-    print(event["command"])
 
-    prepareExecutable(event["executableName"])
-    performTask(event["command"], event["taskName"], event["s3Bucket"])
-    markComplete(event["taskName"], startTime, event["sqsQueueUrl"])
+    backend = event.get("backend", "aws")
+    tasks = event["tasks"] if "tasks" in event else [event]
+    for i, task in enumerate(tasks):
+        # Only the first task of a cold invocation pays for the container's initialization.
+        runTask(task, event["s3Bucket"], event["sqsQueueUrl"], backend, coldStart and i == 0, event.get("attemptId"))
 
     return 0
\ No newline at end of file
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+A compact binary format for alignment results (hits), written by pyssw.py -b and ssw_engine.py -b instead of the text
+output, and a reader which maps the records into a NumPy structured array without parsing them.
+
+Layout (little-endian):
+    header   HIT_MAGIC, record size (uint32), flags (uint32: FLAG_CIGAR if the file has a CIGAR section,
+             FLAG_DEDUPLICATED if each unordered pair of sequences appears at most once, see ssw_engine --symmetric)
+    records  one fixed-width record (RECORD_FORMAT) per hit, in output order
+    cigars   the CIGAR operations of all hits (uint32, as returned by libssw: length << 4 | operation)
+    footer   number of records (uint64), number of CIGAR operations (uint64), END_MAGIC
+Queries and targets are identified by their index (0-based) in the query and target files. Coordinates are 0-based
+and inclusive, as returned by libssw; begins are -1 when they were not computed (score only alignment).
+A record's CIGAR is cigars[cigarOffset:cigarOffset + cigarLength].
+
+The writer only needs the standard library (it runs in the Lambda package); the reader needs numpy.
+
+Usage (prints the hits of a binary result file as tab separated text):
+    python3 ssw_hits.py <hits file>
+"""
+import os
+import sys
+import struct
+import array
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+HIT_MAGIC = b"SSWHITS1"
+END_MAGIC = b"SSWHEND1"
+HEADER_FORMAT = "<8sII"
+FOOTER_FORMAT = "<QQ8s"
+RECORD_FORMAT = "<IIiiiiiiQII"
+RECORD_FIELDS = ["query", "target", "score", "score2", "targetBegin", "targetEnd", "queryBegin", "queryEnd",
+                 "cigarOffset", "cigarLength", "flags"]
+FLAG_CIGAR = 1 # File flag: the hits have CIGARs
+FLAG_DEDUPLICATED = 2 # File flag: no hit has its mirror (query and target swapped) in the file or in other files of the job
+FLAG_REVERSE = 1 # Record flag: the query aligned on the reverse complement strand
+CIGAR_OPERATIONS = "MIDNSHP=X"
+
+# Returns the NumPy dtype of a record (matches RECORD_FORMAT).
+def recordDtype():
+    return numpy.dtype({"names": RECORD_FIELDS,
+                        "formats": ["<u4", "<u4", "<i4", "<i4", "<i4", "<i4", "<i4", "<i4", "<u8", "<u4", "<u4"]})
+
+# Returns the CIGAR string (ex. "12M2I30M") of a sequence of CIGAR operations.
+def cigarString(operations):
+    return "".join(str(operation >> 4) + (CIGAR_OPERATIONS[operation & 15] if operation & 15 <= 8 else "M") for operation in operations)
+
+class HitWriter:
+    """
+    Writes hits to a binary file in the format of this module. The records are written as hits arrive, so the output
+    can be a pipe (ex. the handler's result stream); CIGARs are kept in a spooled temporary file until close().
+
+    Attributes:
+        recordCount: Number of hits written so far.
+    """
+    def __init__(self, output_f, withCigar=False, deduplicated=False):
+        """
+        output_f: A binary file. withCigar: Whether the hits have CIGARs (alignment path).
+        deduplicated: Whether the file is marked with FLAG_DEDUPLICATED.
+        """
+        self.recordCount = 0
+        self.__output_f = output_f
+        self.__withCigar = withCigar
+        self.__cigar_f = tempfile.SpooledTemporaryFile(max_size=64 << 20) if withCigar else None
+        self.__cigarCount = 0
+        self.__record = struct.Struct(RECORD_FORMAT)
+        flags = (FLAG_CIGAR if withCigar else 0) | (FLAG_DEDUPLICATED if deduplicated else 0)
+        output_f.write(struct.pack(HEADER_FORMAT, HIT_MAGIC, self.__record.size, flags))
+
+    def writeHit(self, query, target, score, score2, targetBegin, targetEnd, queryBegin, queryEnd, reverse=False, cigar=None):
+        """
+        Writes one hit. query and target are the indices of the sequences in their files; cigar is a sequence of
+        CIGAR operations (ignored unless the writer was created withCigar).
+        """
+        cigarOffset = self.__cigarCount
+        cigarLength = 0
+        if self.__withCigar and cigar:
+            operations = array.array("I", cigar)
+            if sys.byteorder != "little":
+                operations.byteswap()
+            self.__cigar_f.write(operations.tobytes())
+            cigarLength = len(operations)
+            self.__cigarCount += cigarLength
+        self.__output_f.write(self.__record.pack(query, target, score, score2, targetBegin, targetEnd, queryBegin, queryEnd,
+                                                 cigarOffset, cigarLength, FLAG_REVERSE if reverse else 0))
+        self.recordCount += 1
+
+    def close(self):
+        """
+        Writes the CIGAR section and the footer. Does not close the output file.
+        """
+        if self.__cigar_f is not None:
+            self.__cigar_f.seek(0)
+            chunk = self.__cigar_f.read(1 << 20)
+            while chunk:
+                self.__output_f.write(chunk)
+                chunk = self.__cigar_f.read(1 << 20)
+            self.__cigar_f.close()
+            self.__cigar_f = None
+        self.__output_f.write(struct.pack(FOOTER_FORMAT, self.recordCount, self.__cigarCount, END_MAGIC))
+
+class HitFile:
+    """
+    A binary hits file mapped into memory. Nothing is parsed or copied when the file is opened: records is a read-only
+    NumPy memmap, so columns (ex. records["score"]) and filters (ex. records[records["score"] >= 50]) are computed in C.
+
+    Attributes:
+        path: Path of the file.
+        records: Structured array of the records (fields: RECORD_FIELDS).
+        cigars: uint32 array of the CIGAR operations of all records (empty if the file has no CIGARs).
+        hasCigar: Whether the hits have CIGARs.
+        deduplicated: Whether the file is marked as free of mirrored pairs (FLAG_DEDUPLICATED).
+    """
+    def __init__(self, path):
+        if numpy is None:
+            raise RuntimeError("The numpy package is needed to read binary hits files.")
+        self.path = path
+        headerSize = struct.calcsize(HEADER_FORMAT)
+        footerSize = struct.calcsize(FOOTER_FORMAT)
+        size = os.path.getsize(path)
+        with open(path, "rb") as hits_f:
+            magic, recordSize, flags = struct.unpack(HEADER_FORMAT, hits_f.read(headerSize))
+            if magic != HIT_MAGIC or size < headerSize + footerSize:
+                raise ValueError(path + " is not a binary hits file.")
+            hits_f.seek(size - footerSize)
+            recordCount, cigarCount, endMagic = struct.unpack(FOOTER_FORMAT, hits_f.read(footerSize))
+        dtype = recordDtype()
+        if endMagic != END_MAGIC or recordSize != dtype.itemsize or headerSize + recordCount * recordSize + cigarCount * 4 + footerSize != size:
+            raise ValueError(path + " is truncated or was written by an incompatible version.")
+        self.hasCigar = bool(flags & FLAG_CIGAR)
+        self.deduplicated = bool(flags & FLAG_DEDUPLICATED)
+        # numpy.memmap cannot map empty ranges
+        if recordCount:
+            self.records = numpy.memmap(path, dtype=dtype, mode="r", offset=headerSize, shape=(recordCount,))
+        else:
+            self.records = numpy.zeros(0, dtype=dtype)
+        if cigarCount:
+            self.cigars = numpy.memmap(path, dtype="<u4", mode="r", offset=headerSize + recordCount * recordSize, shape=(cigarCount,))
+        else:
+            self.cigars = numpy.zeros(0, dtype="<u4")
+
+    def __len__(self):
+        return len(self.records)
+
+    def getCigar(self, i):
+        """
+        Returns the CIGAR string of record i ("" if it has none).
+        """
+        record = self.records[i]
+        return cigarString(int(operation) for operation in self.cigars[record["cigarOffset"]:record["cigarOffset"] + record["cigarLength"]])
+
+if __name__ == "__main__":
+    hits = HitFile(sys.argv[1])
+    print("\t".join(RECORD_FIELDS[:8] + ["strand", "cigar"]))
+    for i, record in enumerate(hits.records):
+        print("\t".join([str(record[field]) for field in RECORD_FIELDS[:8]] +
+                        ["-" if record["flags"] & FLAG_REVERSE else "+", hits.getCigar(i) if hits.hasCigar else "*"]))
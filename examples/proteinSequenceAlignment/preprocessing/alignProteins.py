@@ -1,27 +1,88 @@
 """
-Runs pair-wise SSW on all protein partitions.
+Runs pair-wise SSW on all protein partitions, on all the cores of this machine (the baseline the Lambda results are checked against).
 This assumes:
  - partitionProteins.py was already run, the partitions are located in ./proteinPartitions
  - ssw_test is in the same folder as this (./)
- - there is a folder ./results/alignment in which the resulting alignments will go
+The alignment of partitions i and j (i <= j, the same tasks as the clients') goes to ./results/alignment<i>-<j>.
+Tasks run workerCount at a time, the largest first (by the residues in the manifest, or the file sizes without one), so
+the run does not end waiting on one large task. Results which already exist are not recomputed: an interrupted run is
+resumed by running this again. A result is written to a .part file and renamed once ssw_test succeeded, so a result
+file is always complete.
 
 To log errors you can run me with:
 python3 -u alignProteins.py 2>&1 | tee align.log
 """
 
+import os
+import json
 import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 fileCount = 41
 filePath = "./proteinPartitions/"
+resultPath = "./results/alignment"
+# workerCount - Number of ssw_test processes run at once (ssw_test uses one core).
+workerCount = os.cpu_count()
+
+# Returns the size of every partition (index 0 is partition 1): thousands of residues from the manifest written by
+# partitionProteins.py, or the file size (KB) without one.
+def getPartitionSizes():
+    manifestPath = filePath + "manifest.json"
+    if os.path.exists(manifestPath):
+        with open(manifestPath, "r") as manifest_f:
+            return [partition["residues"] / 1000.0 for partition in json.load(manifest_f)["partitions"]]
+    return [os.path.getsize(filePath + "partition" + str(i) + ".fasta") / 1000.0 for i in range(1, fileCount + 1)]
+
+# Returns the (i, j, cost) of every pair of partitions, the largest cost first.
+def createTasks():
+    sizes = getPartitionSizes()
+    tasks = [(i, j, sizes[i - 1] * sizes[j - 1]) for i in range(1, len(sizes) + 1) for j in range(i, len(sizes) + 1)]
+    return sorted(tasks, key=lambda task: task[2], reverse=True)
+
+# Aligns partitions i and j into resultPath<i>-<j>. Returns (i, j, error message or None).
+# Errors (ex. the .part file cannot be written or ssw_test cannot be started) are returned too, so that one failed task
+# does not stop the run while the other ssw_test processes keep going.
+def align(i, j):
+    outputPath = resultPath + str(i) + "-" + str(j)
+    try:
+        with open(outputPath + ".part", "wb") as output_f:
+            process = subprocess.run(["./ssw_test", "-p", filePath + "partition" + str(i) + ".fasta", filePath + "partition" + str(j) + ".fasta",
+                                      "./BLOSUM62", "-o", "10", "-e", "1", "-l"], stdout=output_f, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            return i, j, "ssw_test exited with " + str(process.returncode) + ": " + process.stderr.decode(errors="replace").strip()
+        os.replace(outputPath + ".part", outputPath)
+    except Exception as e:
+        return i, j, repr(e)
+    return i, j, None
 
 def main():
-    for i in range(1, fileCount + 1):
-        for j in range(i, fileCount + 1):
-                print("Starting alignment[" + str(i) + ", " + str(j) + "] at " + str(int(round(time.time() * 1000))) + " ms.")
-                (output, err) = subprocess.Popen("./ssw_test -p ./proteinPartitions/partition" + str(i) + 
-                  ".fasta ./proteinPartitions/partition" + str(j) + ".fasta ./BLOSUM62 -o 10 -e 1 -l  > ./results/alignment" +
-                  str(i) + "-" + str(j), stdout=None, stderr=subprocess.PIPE, shell=True).communicate()
-                if err:
-                    print(err)
+    os.makedirs(os.path.dirname(resultPath), exist_ok=True)
+    tasks = createTasks()
+    pending = [task for task in tasks if not os.path.exists(resultPath + str(task[0]) + "-" + str(task[1]))]
+    totalCost = sum(cost for _, _, cost in pending)
+    print("Aligning " + str(len(pending)) + " of " + str(len(tasks)) + " partition pairs (" + str(len(tasks) - len(pending)) +
+          " already done) with " + str(workerCount) + " workers.")
+
+    startTime = time.time()
+    doneCost = 0
+    failures = 0
+    costs = {(i, j): cost for i, j, cost in pending}
+    # The work runs in the ssw_test processes, so threads are enough to keep workerCount of them busy.
+    with ThreadPoolExecutor(max_workers=workerCount) as executor:
+        futures = [executor.submit(align, i, j) for i, j, _ in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            i, j, error = future.result()
+            elapsed = time.time() - startTime
+            doneCost += costs[(i, j)]
+            if error:
+                failures += 1
+                print("Alignment[" + str(i) + ", " + str(j) + "] failed: " + error)
+            rate = doneCost / elapsed if elapsed > 0 else 0
+            remaining = (totalCost - doneCost) / rate if rate > 0 else 0
+            print("Finished alignment[" + str(i) + ", " + str(j) + "]: " + str(done) + "/" + str(len(pending)) + " tasks, " +
+                  str(round(elapsed, 1)) + " s elapsed, " + str(round(done / elapsed if elapsed > 0 else 0, 3)) + " tasks/s, " +
+                  str(round(rate, 1)) + " cost/s, about " + str(round(remaining)) + " s left.")
+    print("Done in " + str(round(time.time() - startTime, 1)) + " s, " + str(failures) + " failed.")
 
 main()
@@ -0,0 +1,22 @@
+"""
+Writes the faidx index (<proteinFilePath>.fai, the format of samtools faidx) of the protein file, so that tasks can align
+ranges of its records (path:first-last, see ssw_engine.py) instead of whole partition files.
+Add the protein file and its index to the Lambda package, and copy the index next to the client (see sourceFastaName in
+minimal_align_client.py), which cuts the tasks from it.
+This expects ssw_engine.py in ../ssw.
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ssw"))
+import ssw_engine
+
+proteinFilePath = "../originalData/uniprot_humanProteinList.fasta"
+
+def main():
+    print("Indexing file [" + proteinFilePath + "]...")
+    ssw_engine.buildIndex(proteinFilePath)
+    with open(proteinFilePath + ".fai", "r") as index_f:
+        print("Wrote index [" + proteinFilePath + ".fai] for [" + str(sum(1 for _ in index_f)) + "] proteins")
+
+main()
@@ -0,0 +1,36 @@
+"""
+Turns the protein partitions (partitionN.fasta, see partitionProteins.py) into partition packages (partitionN.sswp) for the
+Lambda package: the residues are encoded for the score matrix once, here, and ssw_engine.py maps the packages instead of
+parsing and encoding the FASTA files in every task (see ssw_engine.writePackage for the format).
+This expects the partitions to be in partitionPath and ssw_engine.py in ../ssw. The packages are written to packagePath.
+"""
+import os
+import sys
+import glob
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ssw"))
+import ssw_engine
+import ssw_lib
+
+partitionPath = "./proteinPartitions/"
+packagePath = "./proteinPartitions/"
+# matrixPath - The score matrix file the tasks align with (-a), which sets the encoding of the residues.
+# None for ssw_engine's default protein matrix (Blosum50); packages encoded for another matrix still work, but are
+# translated in every task.
+matrixPath = None
+
+def main():
+    elements = ssw_lib.read_matrix(matrixPath)[0] if matrixPath else ssw_engine.AA_ELEMENTS
+    os.makedirs(packagePath, exist_ok=True)
+    fastaSize = 0
+    packageSize = 0
+    for partitionFile in sorted(glob.glob(partitionPath + "partition*.fasta")):
+        name = os.path.splitext(os.path.basename(partitionFile))[0]
+        destination = packagePath + name + ".sswp"
+        ssw_engine.writePackage(ssw_engine.readSequences(partitionFile), elements, destination)
+        fastaSize += os.path.getsize(partitionFile)
+        packageSize += os.path.getsize(destination)
+        print("Created package [" + destination + "] (" + str(os.path.getsize(destination)) + " bytes, FASTA " + str(os.path.getsize(partitionFile)) + " bytes)")
+    print("Total: " + str(packageSize) + " bytes of packages for " + str(fastaSize) + " bytes of FASTA")
+
+main()
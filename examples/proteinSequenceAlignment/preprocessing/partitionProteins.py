@@ -1,40 +1,95 @@
 """
-Splits a .fasta protein file into partitions of the specified size.
+Splits a .fasta protein file into partitions of about the same alignment cost.
 This expects the protein file path to be specified in proteinFilePath.
-The resulting partitions will be created inside the folder specified by proteinDestinationPath.
-Partition size (number of proteins per partition) is specified in proteinsPerFile.
+The resulting partitions will be created inside the folder specified by proteinDestinationPath, together with a manifest
+(manifestName) listing the proteins, residues and weight of every partition, which the clients use to estimate task sizes.
+The number of partitions is specified in partitionCount; how proteins are weighed is specified in balanceBy.
+The input is streamed (read twice: once to total the weights, once to write the partitions), so only one protein is in
+memory at a time, whatever the size of the input.
 """
+import os
+import json
+
 proteinFilePath = "../originalData/uniprot_humanProteinList.fasta"
 proteinDestinationPath = "./proteinPartitions/"
-proteinsPerFile = 500
+manifestName = "manifest.json"
+partitionCount = 41
+# balanceBy - "residues": every partition gets about the same number of residues, so every task (i, j) aligns about the
+# same number of residue pairs. "cost": every protein also weighs sequenceOverhead residues, for the work done per
+# alignment whatever the length of the proteins (profiles, calls, output), which favors partitions of short proteins.
+balanceBy = "residues"
+sequenceOverhead = 64
+
+# Yields (header line, sequence lines, residue count) for each protein of the FASTA file, reading one line at a time.
+def readProteins(filePath):
+    with open(filePath, "r") as proteinSourceFile:
+        header = None
+        lines = []
+        residues = 0
+        for line in proteinSourceFile:
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, lines, residues
+                header = line
+                lines = []
+                residues = 0
+            elif header is not None:
+                lines.append(line)
+                residues += len(line.strip())
+        if header is not None:
+            yield header, lines, residues
+
+# Returns the weight of a protein of the given length, see balanceBy.
+def getWeight(residues):
+    if balanceBy == "cost":
+        return residues + sequenceOverhead
+    return residues
+
+# Returns the total weight of the proteins of the FASTA file.
+def getTotalWeight(filePath):
+    return sum(getWeight(residues) for _, _, residues in readProteins(filePath))
 
-def createFile(filePath, content, proteinCount):
-    print("Creating file [" + filePath + "] with [" + str(proteinCount) + "] proteins")
-    with open(filePath, "w") as destinationFile:
-        destinationFile.write(content)
+def closePartition(partitionFile, partition):
+    partitionFile.close()
+    print("Created file [" + partition["file"] + "] with [" + str(partition["proteins"]) + "] proteins and [" +
+          str(partition["residues"]) + "] residues")
 
 def main():
-    with open(proteinFilePath, "r") as proteinSourceFile:
-        print("Reading file [" + proteinFilePath + "] into memory...")
-        proteinData = proteinSourceFile.readlines()
-        print("Done reading file.")
-        totalLines = len(proteinData)
-
-        lineNumber = 0
-        fileCounter = 0
-        while lineNumber < totalLines:
-            proteinsCounter = 0
-            proteinsBuffer = ""
-            while lineNumber < totalLines:
-                if proteinData[lineNumber][0] == '>': #Started reading a new protein
-                    if proteinsCounter == proteinsPerFile:
-                        # proteinsPerFile number of proteins read and started reading a new protein.
-                        break
-                    proteinsCounter += 1
-                proteinsBuffer += proteinData[lineNumber]
-                lineNumber += 1
-            fileCounter += 1
-            filePath = proteinDestinationPath +"partition" + str(fileCounter) + ".fasta"
-            createFile(filePath=filePath, content=proteinsBuffer, proteinCount=proteinsCounter)
-
-main()
\ No newline at end of file
+    print("Measuring file [" + proteinFilePath + "]...")
+    totalWeight = getTotalWeight(proteinFilePath)
+    targetWeight = totalWeight / float(partitionCount)
+    print("Total weight: " + str(totalWeight) + ", target weight per partition: " + str(targetWeight))
+
+    os.makedirs(proteinDestinationPath, exist_ok=True)
+    partitions = []
+    partitionFile = None
+    writtenWeight = 0
+    for header, lines, residues in readProteins(proteinFilePath):
+        weight = getWeight(residues)
+        # Partition k ends at k * targetWeight: start the next one once this protein would mostly fall beyond that.
+        if partitionFile is None or (len(partitions) < partitionCount and writtenWeight + weight / 2.0 > len(partitions) * targetWeight):
+            if partitionFile is not None:
+                closePartition(partitionFile, partitions[-1])
+            partitions.append({"partition": len(partitions) + 1, "file": "partition" + str(len(partitions) + 1) + ".fasta",
+                               "proteins": 0, "residues": 0, "weight": 0})
+            partitionFile = open(proteinDestinationPath + partitions[-1]["file"], "w")
+        partitionFile.write(header)
+        partitionFile.writelines(lines)
+        partitions[-1]["proteins"] += 1
+        partitions[-1]["residues"] += residues
+        partitions[-1]["weight"] += weight
+        writtenWeight += weight
+    if partitionFile is not None:
+        closePartition(partitionFile, partitions[-1])
+
+    manifest = {
+        "source": proteinFilePath,
+        "balanceBy": balanceBy,
+        "sequenceOverhead": sequenceOverhead if balanceBy == "cost" else 0,
+        "partitions": partitions
+    }
+    with open(proteinDestinationPath + manifestName, "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=2)
+    print("Wrote manifest [" + proteinDestinationPath + manifestName + "] for [" + str(len(partitions)) + "] partitions")
+
+main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the residue encoders: pyssw.to_int (one residue at a time, dict lookup, ctypes array) against
+ssw_engine.encodeSequence (bytes.translate). Both produce the same matrix indices; the benchmark checks this first.
+Does not need libssw.so.
+
+Usage:
+    python3 encode_benchmark.py [sequence file]
+Without a sequence file a random protein of the length of titin (34350 residues) is encoded.
+"""
+import sys
+import random
+import timeit
+
+import pyssw
+import ssw_engine
+
+def main():
+    if len(sys.argv) > 1:
+        sequences = [sequence.decode() for _, sequence in ssw_engine.readSequences(sys.argv[1])]
+        label = sys.argv[1] + " (" + str(len(sequences)) + " sequences)"
+    else:
+        sequences = ["".join(random.Random(0).choice("ACDEFGHIKLMNPQRSTVWYX") for _ in range(34350))]
+        label = "random protein of 34350 residues"
+    elements = ssw_engine.AA_ELEMENTS
+    dEle2Int = {}
+    for i, element in enumerate(elements):
+        dEle2Int[element] = i
+        dEle2Int[element.lower()] = i
+    table = ssw_engine.createTable(elements)
+    encodedSequences = [sequence.encode() for sequence in sequences]
+
+    for sequence, encodedSequence in zip(sequences, encodedSequences):
+        if bytes(pyssw.to_int(sequence, elements, dEle2Int)) != ssw_engine.encodeSequence(encodedSequence, table):
+            print("The encoders disagree on a sequence.")
+            sys.exit(1)
+
+    repeats = 5
+    toIntTime = min(timeit.repeat(lambda: [pyssw.to_int(sequence, elements, dEle2Int) for sequence in sequences], number=1, repeat=repeats))
+    translateTime = min(timeit.repeat(lambda: [ssw_engine.asInt8Pointer(ssw_engine.encodeSequence(sequence, table)) for sequence in encodedSequences], number=1, repeat=repeats))
+    residues = sum(len(sequence) for sequence in sequences)
+    print("Encoding " + label + ", " + str(residues) + " residues (best of " + str(repeats) + "):")
+    print("to_int:         " + str(toIntTime * 1000) + " ms")
+    print("encodeSequence: " + str(translateTime * 1000) + " ms")
+    print("Speedup:        " + str(toIntTime / translateTime) + "x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Recall report of the seed prefilter of ssw_engine.py (--prefilter): aligns the target and query files once exhaustively
+and once with the prefilter, and reports how many pairs the prefilter aligned, how long each run took and which share of
+the exhaustive hits above each score threshold the prefilter kept. The prefilter does not change the score of the
+pairs it keeps, so only hits of skipped pairs can be lost.
+Needs libssw.so next to ssw_engine.py, and numpy (to read the hits, see ssw_hits.HitFile).
+
+Usage (options are ssw_engine.py options, ex. --seed-pattern 11111 --max-evalue 0.1 --diagonal-band 16):
+    python3 prefilter_recall.py -p -o 10 -e 1 [options] <target.fasta> <query.fasta>
+"""
+import sys
+import time
+import tempfile
+
+import ssw_engine
+import ssw_hits
+
+THRESHOLDS = [50, 100, 200, 300, 500]
+
+# Runs ssw_engine with args (binary output) and returns (HitFile, pairs aligned, seconds). The hits file is removed when
+# the process exits.
+def runEngine(args):
+    output_f = tempfile.NamedTemporaryFile(prefix="hits-", suffix=".bin")
+    startTime = time.time()
+    pairsAligned = ssw_engine.alignTask(args + ["-b"], output_f)
+    elapsed = time.time() - startTime
+    output_f.flush()
+    hits = ssw_hits.HitFile(output_f.name)
+    hits.file = output_f # Keeps the temporary file until the hits are no longer used
+    return hits, pairsAligned, elapsed
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    exhaustive, exhaustivePairs, exhaustiveTime = runEngine([arg for arg in args if arg != "--prefilter"])
+    prefiltered, prefilteredPairs, prefilteredTime = runEngine(args + ["--prefilter"])
+
+    keptPairs = set(zip(prefiltered.records["query"].tolist(), prefiltered.records["target"].tolist()))
+    print("Pairs aligned:    " + str(exhaustivePairs) + " exhaustive, " + str(prefilteredPairs) + " with the prefilter (" +
+          str(round(100.0 * prefilteredPairs / max(1, exhaustivePairs), 2)) + "%)")
+    print("Time:             " + str(round(exhaustiveTime, 3)) + " s exhaustive, " + str(round(prefilteredTime, 3)) + " s with the prefilter (speedup " +
+          str(round(exhaustiveTime / max(prefilteredTime, 1e-9), 2)) + "x)")
+    print("Threshold, Exhaustive Hits, Kept Hits, Recall")
+    records = exhaustive.records
+    for threshold in THRESHOLDS:
+        above = records[records["score"] >= threshold]
+        kept = sum(1 for pair in zip(above["query"].tolist(), above["target"].tolist()) if pair in keptPairs)
+        recall = kept / float(len(above)) if len(above) else 1.0
+        print(str(threshold) + ", " + str(len(above)) + ", " + str(kept) + ", " + str(round(recall, 4)))
+
+if __name__ == "__main__":
+    main()
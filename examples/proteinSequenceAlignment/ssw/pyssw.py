@@ -1,8 +1,12 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 """
 Simple python wrapper for SSW library
 Please put the path of libssw.so into LD_LIBRARY_PATH or pass it explicitly as a parameter
 By Yongan Zhao (March 2016)
+
+The target file is parsed and encoded only once (see ssw_engine.TargetStore) and scanned by every query profile.
+With -b the hits are written in the binary format of ssw_hits.py (read it with ssw_hits.HitFile) instead of text.
+With --symmetric (target and query are the same file) query i is only aligned against targets j >= i (j > i with --skip-identity).
 """
 
 import sys
@@ -12,8 +16,12 @@ import ctypes as ct
 import timeit as ti
 import gzip
 import math
+import multiprocessing as mp
+import heapq
 
 import ssw_lib
+from ssw_engine import TargetStore, createTable, encodeSequence, asInt8Pointer
+from ssw_hits import HitWriter
 
 
 
@@ -52,9 +60,9 @@ def read(sFile):
         sQual = ''
         for l in f:
             sId = l.strip()[1:].split()[0]
-            sSeq = f.next()
-            s3 = f.next()
-            sQual = f.next()
+            sSeq = next(f).strip()
+            s3 = next(f)
+            sQual = next(f).strip()
 
             yield sId, sSeq, sQual
 
@@ -62,29 +70,29 @@ def read(sFile):
     bFasta = True
     ext = op.splitext(sFile)[1][1:].strip().lower()
     if ext == 'gz' or ext == 'gzip':
-        with gzip.open(sFile, 'r') as f:
-            l = f.next()
+        with gzip.open(sFile, 'rt') as f:
+            l = next(f)
             if l.startswith('>'):
                 bFasta = True
             elif l.startswith('@'):
                 bFasta = False
             else:
-                print >> sys.stderr, 'file format cannot be recognized'
+                print('file format cannot be recognized', file=sys.stderr)
                 sys.exit()
     else:
         with open(sFile, 'r') as f:
-            l = f.next()
+            l = next(f)
             if l.startswith('>'):
                 bFasta = True
             elif l.startswith('@'):
                 bFasta = False
             else:
-                print >> sys.stderr, 'file format cannot be recognized'
+                print('file format cannot be recognized', file=sys.stderr)
                 sys.exit()
 
 # read
     if ext == 'gz' or ext == 'gzip':
-        with gzip.open(sFile, 'r') as f:
+        with gzip.open(sFile, 'rt') as f:
             if bFasta == True:
                 for sId,sSeq,sQual in read_one_fasta(f):
                     yield sId, sSeq, sQual
@@ -104,6 +112,7 @@ def read(sFile):
 def to_int(seq, lEle, dEle2Int):
     """
     translate a sequence into numbers
+    one residue at a time; main uses the table-driven ssw_engine.encodeSequence instead (see encode_benchmark.py)
     @param  seq   a sequence
     """
     num_decl = len(seq) * ct.c_int8
@@ -119,7 +128,7 @@ def to_int(seq, lEle, dEle2Int):
     return num
 
 
-def align_one(ssw, qProfile, rNum, nRLen, nOpen, nExt, nFlag, nMaskLen):
+def align_one(ssw, qProfile, rNum, nRLen, nOpen, nExt, nFlag, nMaskLen, nFilter=0):
     """
     align one pair of sequences
     @param  qProfile   query profile
@@ -127,8 +136,9 @@ def align_one(ssw, qProfile, rNum, nRLen, nOpen, nExt, nFlag, nMaskLen):
     @param  nRLen   length of reference sequence
     @param  nFlag   alignment flag
     @param  nMaskLen   mask length
+    @param  nFilter   score filter: with nFlag 2 the path is only traced back if the score >= nFilter
     """
-    res = ssw.ssw_align(qProfile, rNum, ct.c_int32(nRLen), nOpen, nExt, nFlag, 0, 0, nMaskLen)
+    res = ssw.ssw_align(qProfile, rNum, ct.c_int32(nRLen), nOpen, nExt, nFlag, nFilter, 0, nMaskLen)
 
     nScore = res.contents.nScore
     nScore2 = res.contents.nScore2
@@ -171,7 +181,7 @@ def buildPath(q, r, nQryBeg, nRefBeg, lCigar):
 
         if c == 'M':
             sQ += q[nQOff : nQOff+n]
-            sA += ''.join(['|' if q[nQOff+j] == r[nROff+j] else '*' for j in xrange(n)])
+            sA += ''.join(['|' if q[nQOff+j] == r[nROff+j] else '*' for j in range(n)])
             sR += r[nROff : nROff+n]
             nQOff += n
             nROff += n
@@ -191,6 +201,221 @@ def buildPath(q, r, nQryBeg, nRefBeg, lCigar):
 
 
 
+def select_hits(ssw, targets, qProfile, qRcProfile, args, nFlag, nMaskLen, nFirst=0):
+    """
+    align one query against all targets and select the hits to report: the score must be >= args.nThr and,
+    with args.nTopK > 0, only the k best hits are kept (in a bounded heap, best first, ties in target order)
+    with top-k the targets are first scored without traceback and only the kept hits are aligned again with nFlag
+    @param  qRcProfile   reverse complement query profile or None
+    @param  nFirst   index of the first target to align (symmetric mode)
+    @return   list of (target index, res, resRc)
+    """
+    def align_target(nR, nFlagUsed):
+        rNum, nRLen = targets.getTarget(nR)
+        res = align_one(ssw, qProfile, rNum, nRLen, args.nOpen, args.nExt, nFlagUsed, nMaskLen, args.nThr)
+        resRc = None
+        if qRcProfile:
+            resRc = align_one(ssw, qRcProfile, rNum, nRLen, args.nOpen, args.nExt, nFlagUsed, nMaskLen, args.nThr)
+        return res, resRc
+
+    def best_score(res, resRc):
+        return max(res[0], resRc[0]) if resRc else res[0]
+
+    if args.nTopK <= 0:
+        lHits = []
+        for nR in range(nFirst, len(targets)):
+            res, resRc = align_target(nR, nFlag)
+            if best_score(res, resRc) >= args.nThr:
+                lHits.append((nR, res, resRc))
+        return lHits
+
+    lHeap = [] # (score, -target index, res, resRc); the worst kept hit is at the top
+    for nR in range(nFirst, len(targets)):
+        res, resRc = align_target(nR, 0)
+        nScore = best_score(res, resRc)
+        if nScore < args.nThr:
+            continue
+        hit = (nScore, -nR, res, resRc)
+        if len(lHeap) < args.nTopK:
+            heapq.heappush(lHeap, hit)
+        elif hit > lHeap[0]:
+            heapq.heapreplace(lHeap, hit)
+    lHits = []
+    for nScore, nNegR, res, resRc in sorted(lHeap, reverse=True):
+        if nFlag:
+            res, resRc = align_target(-nNegR, nFlag)
+        lHits.append((-nNegR, res, resRc))
+    return lHits
+
+
+def align_query(ssw, targets, nQ, sQId, sQSeq, sQQual, args, mat, lEle, sTable, dRc, nFlag):
+    """
+    align one query sequence against all targets
+    @param  targets   TargetStore of the target sequences
+    @param  nQ   index of the query in the query file
+    @return   the output text for this query or, with -b, the list of hits (arguments of HitWriter.writeHit)
+    """
+    lOut = []
+# build query profile
+    qNum = encodeSequence(sQSeq.encode(), sTable)
+    qProfile = ssw.ssw_init(asInt8Pointer(qNum), ct.c_int32(len(sQSeq)), mat, len(lEle), 2)
+# build rc query profile
+    if args.bBest and not args.bProtien:
+        sQRcSeq = ''.join([dRc[x] for x in sQSeq[::-1]])
+        qRcNum = encodeSequence(sQRcSeq.encode(), sTable)
+        qRcProfile = ssw.ssw_init(asInt8Pointer(qRcNum), ct.c_int32(len(sQSeq)), mat, len(lEle), 2)
+# set mask len
+    if len(sQSeq) > 30:
+        nMaskLen = len(sQSeq) // 2
+    else:
+        nMaskLen = 15
+
+# score all targets and keep the hits passing -f/-k before any traceback or formatting
+# format ofres: (nScore, nScore2, nRefBeg, nRefEnd, nQryBeg, nQryEnd, nRefEnd2, nCigarLen, lCigar)
+# symmetric mode: only the upper triangle, the score of (nQ, nR) is that of (nR, nQ)
+    nFirst = nQ + (1 if args.bSkipIdentity else 0) if args.bSymmetric else 0
+    lHits = select_hits(ssw, targets, qProfile, qRcProfile if args.bBest and not args.bProtien else None, args, nFlag, nMaskLen, nFirst)
+
+    ssw.init_destroy(qProfile)
+    if args.bBest and not args.bProtien:
+        ssw.init_destroy(qRcProfile)
+
+# binary output: the hits as they are, no path or text to build
+    if args.bBinary:
+        lOut = []
+        for nR, res, resRc in lHits:
+            bReverse = not (resRc == None or res[0] > resRc[0])
+            resPrint = resRc if bReverse else res
+            lOut.append((nQ, nR) + resPrint[:6] + (bReverse, resPrint[8]))
+        return lOut
+
+# iter hits
+    for nR, res, resRc in lHits:
+        sRId = targets.names[nR]
+        sRSeq = targets.sequences[nR]
+
+# build cigar and trace back path
+        strand = 0
+        if resRc == None or res[0] > resRc[0]:
+            resPrint = res
+            strand = 0
+            sCigar, sQ, sA, sR = buildPath(sQSeq, sRSeq, res[4], res[2], res[8])
+        else:
+            resPrint = resRc
+            strand = 1
+            sCigar, sQ, sA, sR = buildPath(sQRcSeq, sRSeq, resRc[4], resRc[2], resRc[8])
+
+# print results
+        if not args.bSam:
+            lOut.append('target_name: {}\nquery_name: {}\noptimal_alignment_score: {}\t'.format(sRId, sQId, resPrint[0]))
+            if resPrint[1] > 0:
+                lOut.append('suboptimal_alignment_score: {}\t'.format(resPrint[1]))
+            if strand == 0:
+                lOut.append('strand: +\t')
+            else: 
+                lOut.append('strand: -\t')
+            if resPrint[2] + 1:
+                lOut.append('target_begin: {}\t'.format(resPrint[2] + 1))
+            lOut.append('target_end: {}\t'.format(resPrint[3] + 1))
+            if resPrint[4] + 1:
+                lOut.append('query_begin: {}\t'.format(resPrint[4] + 1))
+            lOut.append('query_end: {}\n\n'.format(resPrint[5] + 1))
+            if resPrint[-2] > 0:
+                n1 = 1 + resPrint[2]
+                n2 = min(60,len(sR)) + resPrint[2] - sR.count('-',0,60)
+                n3 = 1 + resPrint[4]
+                n4 = min(60,len(sQ)) + resPrint[4] - sQ.count('-',0,60)
+                for i in range(0, len(sQ), 60):
+                    lOut.append('Target:{:>8}\t{}\t{}'.format(n1, sR[i:i+60], n2) + '\n')
+                    n1 = n2 + 1
+                    n2 = n2 + min(60,len(sR)-i-60) - sR.count('-',i+60,i+120)
+
+                    lOut.append('{: ^15}\t{}'.format('', sA[i:i+60]) + '\n')
+
+                    lOut.append('Query:{:>9}\t{}\t{}\n'.format(n3, sQ[i:i+60], n4) + '\n')
+                    n3 = n4 + 1
+                    n4 = n4 + min(60,len(sQ)-i-60) - sQ.count('-',i+60,i+120)
+        else:
+            lOut.append("{}\t".format(sQId))
+            if resPrint[0] == 0:
+                lOut.append("4\t*\t0\t255\t*\t*\t0\t0\t*\t*\n")
+            else:
+                fDiff = 1-abs(resPrint[0]-resPrint[1])/float(resPrint[0])
+# no suboptimal alignment: the log is infinite, ssw_test caps mapq at 254 as well
+                mapq = int(-4.343 * math.log(fDiff)) if fDiff > 0 else 254
+                mapq = int(mapq + 4.99);
+                if mapq >= 254:
+                    mapq = 254
+                if strand == 1:
+                    lOut.append('16\t')
+                else:
+                    lOut.append('0\t')
+                lOut.append('{}\t{}\t{}\t'.format(sRId, resPrint[2]+1, mapq))
+                lOut.append(sCigar)
+                lOut.append('\t*\t0\t0\t')
+                lOut.append(sQSeq[resPrint[4]:resPrint[5]+1] if strand==0 else sQRcSeq[resPrint[4]:resPrint[5]+1])
+                lOut.append('\t')
+                if sQQual:
+                    if strand == 0:
+                        lOut.append(sQQual[resPrint[4]:resPrint[5]+1])
+                    else:
+                        lOut.append(sQQual[-resPrint[4]-1:-resPrint[5]-1:-1])
+                else:
+                    lOut.append('*')
+
+                lOut.append('\tAS:i:{}'.format(resPrint[0]))
+                lOut.append('\tNM:i:{}\t'.format(len(sA)-sA.count('|')))
+                if resPrint[1] > 0:
+                    lOut.append('ZS:i:{}\n'.format(resPrint[1]))
+                else:
+                    lOut.append('\n')
+
+
+    return ''.join(lOut)
+
+
+# number of queries a worker process aligns per task; small chunks balance queries of different lengths
+QUERIES_PER_CHUNK = 4
+
+# state of a worker process, see init_worker
+dWorker = {}
+
+
+def init_worker(args, dTargets, lScore, lEle, dRc, nFlag):
+    """
+    set up a worker process: load libssw and map the targets shared by the main process
+    @param  dTargets   description of the shared targets returned by TargetStore.share
+    """
+    mat = (len(lScore) * ct.c_int8) ()
+    mat[:] = lScore
+    dWorker['ssw'] = ssw_lib.CSsw(args.sLibPath)
+    dWorker['targets'] = TargetStore.attach(dTargets)
+    dWorker['params'] = (args, mat, lEle, createTable(lEle), dRc, nFlag)
+
+
+def align_chunk(lQueries):
+    """
+    align a chunk of queries in a worker process
+    @param  lQueries   list of (nQ, sQId, sQSeq, sQQual)
+    @return   the output of each query of the chunk
+    """
+    return [align_query(dWorker['ssw'], dWorker['targets'], nQ, sQId, sQSeq, sQQual, *dWorker['params']) for nQ,sQId,sQSeq,sQQual in lQueries]
+
+
+def chunk_queries(iQueries, nSize):
+    """
+    group the query records into lists of nSize
+    """
+    lChunk = []
+    for query in iQueries:
+        lChunk.append(query)
+        if len(lChunk) == nSize:
+            yield lChunk
+            lChunk = []
+    if lChunk:
+        yield lChunk
+
+
 def main(args):
     lEle = []
     dRc = {} 
@@ -206,15 +431,15 @@ def main(args):
                 dEle2Int[ele.lower()] = i
                 dInt2Ele[i] = ele
             nEleNum = len(lEle)
-            lScore = [0 for i in xrange(nEleNum**2)]
-            for i in xrange(nEleNum-1):
-                for j in xrange(nEleNum-1):
+            lScore = [0 for i in range(nEleNum**2)]
+            for i in range(nEleNum-1):
+                for j in range(nEleNum-1):
                     if lEle[i] == lEle[j]:
                         lScore[i*nEleNum+j] = args.nMatch
                     else:
                         lScore[i*nEleNum+j] = -args.nMismatch
         else:
-            lEle, dEle2Int, dInt2Ele, lScore = ssw.read_matrix(args.sMatrix)
+            lEle, dEle2Int, dInt2Ele, lScore = ssw_lib.read_matrix(args.sMatrix)
     else:
 # load AA score matrix
         if not args.sMatrix:
@@ -227,10 +452,10 @@ def main(args):
             lScore = ssw_lib.lBlosum50
         else:
             # assume the format of the input score matrix is the same as that of http://www.ncbi.nlm.nih.gov/Class/FieldGuide/BLOSUM62.txt
-            lEle, dEle2Int, dInt2Ele, lScore = ssw.read_matrix(args.sMatrix)
+            lEle, dEle2Int, dInt2Ele, lScore = ssw_lib.read_matrix(args.sMatrix)
 
     if args.bBest and args.bProtien:
-        print >> sys.stderr, 'Reverse complement alignment is not available for protein sequences.'
+        print('Reverse complement alignment is not available for protein sequences.', file=sys.stderr)
 
 # translate score matrix to ctypes
     mat = (len(lScore) * ct.c_int8) ()
@@ -240,120 +465,56 @@ def main(args):
     if args.bPath:
         nFlag = 2
 # print sam head
-    if args.bSam and args.bHeader and args.bPath:
-        print '@HD\tVN:1.4\tSO:queryname'
+    if args.bBinary:
+        args.bSam = False
+    elif args.bSam and args.bHeader and args.bPath:
+        print('@HD\tVN:1.4\tSO:queryname')
         for sRId,sRSeq,_ in read(args.target):
-            print '@SQ\tSN:{}\tLN:{}'.format(sRId, len(sRSeq))
+            print('@SQ\tSN:{}\tLN:{}'.format(sRId, len(sRSeq)))
     elif args.bSam and not args.bPath:
-        print >> sys.stderr, 'SAM format output is only available together with option -c.\n'
+        print('SAM format output is only available together with option -c.\n', file=sys.stderr)
         args.bSam = False
 
+    if args.bSymmetric and not op.samefile(args.target, args.query):
+        print('--symmetric needs the same file as target and query.', file=sys.stderr)
+        sys.exit(1)
+    if args.bSymmetric and args.nTopK > 0:
+# query i only meets the targets j >= i, so its best hits among the other targets would be missing
+        print('-k cannot be used together with --symmetric.', file=sys.stderr)
+        sys.exit(1)
+
     ssw = ssw_lib.CSsw(args.sLibPath)
+# translation table: residue -> index in the score matrix, unknown residues -> last element
+    sTable = createTable(lEle)
+# parse and encode all target sequences once; the sequences themselves are only needed for the text output
+    targets = TargetStore(((sRId, sRSeq) for sRId,sRSeq,_ in read(args.target)), lambda sSeq: encodeSequence(sSeq.encode(), sTable), keepSequences=not args.bBinary)
+# output: text, or binary hit records
+    if args.bBinary:
+        hitWriter = HitWriter(sys.stdout.buffer, withCigar=args.bPath, deduplicated=args.bSymmetric or args.bDeduplicated)
+        def write_out(lHits):
+            for hit in lHits:
+                hitWriter.writeHit(*hit)
+    else:
+        write_out = sys.stdout.write
 # iterate query sequence
-    for sQId,sQSeq,sQQual in read(args.query):
-# build query profile
-        qNum = to_int(sQSeq, lEle, dEle2Int)
-        qProfile = ssw.ssw_init(qNum, ct.c_int32(len(sQSeq)), mat, len(lEle), 2)
-# build rc query profile
-        if args.bBest and not args.bProtien:
-            sQRcSeq = ''.join([dRc[x] for x in sQSeq[::-1]])
-            qRcNum = to_int(sQRcSeq, lEle, dEle2Int)
-            qRcProfile = ssw.ssw_init(qRcNum, ct.c_int32(len(sQSeq)), mat, len(lEle), 2)
-# set mask len
-        if len(sQSeq) > 30:
-            nMaskLen = len(sQSeq) / 2
-        else:
-            nMaskLen = 15
-
-# iter target sequence
-        for sRId,sRSeq,_ in read(args.target):
-            rNum = to_int(sRSeq, lEle, dEle2Int)
-
-# format ofres: (nScore, nScore2, nRefBeg, nRefEnd, nQryBeg, nQryEnd, nRefEnd2, nCigarLen, lCigar)
-            res = align_one(ssw, qProfile, rNum, len(sRSeq), args.nOpen, args.nExt, nFlag, nMaskLen)
-# align rc query
-            resRc = None
-            if args.bBest and not args.bProtien:
-                resRc = align_one(ssw, qRcProfile, rNum, len(sRSeq), args.nOpen, args.nExt, nFlag, nMaskLen)
-
-# build cigar and trace back path
-            strand = 0
-            if resRc == None or res[0] > resRc[0]:
-                resPrint = res
-                strand = 0
-                sCigar, sQ, sA, sR = buildPath(sQSeq, sRSeq, res[4], res[2], res[8])
-            else:
-                resPrint = resRc
-                strand = 1
-                sCigar, sQ, sA, sR = buildPath(sQRcSeq, sRSeq, resRc[4], resRc[2], resRc[8])
-
-# print results
-            if not args.bSam:
-                print 'target_name: {}\nquery_name: {}\noptimal_alignment_score: {}\t'.format(sRId, sQId, resPrint[0]),
-                if resPrint[1] > 0:
-                    print 'suboptimal_alignment_score: {}\t'.format(resPrint[1]),
-                if strand == 0:
-                    print 'strand: +\t',
-                else: 
-                    print 'strand: -\t',
-                if resPrint[2] + 1:
-                    print 'target_begin: {}\t'.format(resPrint[2] + 1),
-                print 'target_end: {}\t'.format(resPrint[3] + 1),
-                if resPrint[4] + 1:
-                    print 'query_begin: {}\t'.format(resPrint[4] + 1),
-                print 'query_end: {}\n'.format(resPrint[5] + 1)
-                if resPrint[-2] > 0:
-                    n1 = 1 + resPrint[2]
-                    n2 = min(60,len(sR)) + resPrint[2] - sR.count('-',0,60)
-                    n3 = 1 + resPrint[4]
-                    n4 = min(60,len(sQ)) + resPrint[4] - sQ.count('-',0,60)
-                    for i in range(0, len(sQ), 60):
-                        print 'Target:{:>8}\t{}\t{}'.format(n1, sR[i:i+60], n2)
-                        n1 = n2 + 1
-                        n2 = n2 + min(60,len(sR)-i-60) - sR.count('-',i+60,i+120)
-
-                        print '{: ^15}\t{}'.format('', sA[i:i+60])
-
-                        print 'Query:{:>9}\t{}\t{}\n'.format(n3, sQ[i:i+60], n4)
-                        n3 = n4 + 1
-                        n4 = n4 + min(60,len(sQ)-i-60) - sQ.count('-',i+60,i+120)
-            else:
-                print "{}\t".format(sQId),
-                if resPrint[0] == 0:
-                    print "4\t*\t0\t255\t*\t*\t0\t0\t*\t*",
-                else:
-                    mapq = int(-4.343 * math.log(1-abs(resPrint[0]-resPrint[1])/float(resPrint[0])))
-                    mapq = int(mapq + 4.99);
-                    if mapq >= 254:
-                        mapq = 254
-                    if strand == 1:
-                        print '16\t',
-                    else:
-                        print '0\t',
-                    print '{}\t{}\t{}\t'.format(sRId, resPrint[2]+1, mapq),
-                    print sCigar,
-                    print '\t*\t0\t0\t',
-                    print sQSeq[resPrint[4]:resPrint[5]+1] if strand==0 else sQRcSeq[resPrint[4]:resPrint[5]+1],
-                    print '\t',
-                    if sQQual:
-                        if strand == 0:
-                            print sQQual[resPrint[4]:resPrint[5]+1],
-                        else:
-                            print sQQual[-resPrint[4]-1:-resPrint[5]-1:-1]
-                    else:
-                        print '*',
-
-                    print '\tAS:i:{}'.format(resPrint[0]),
-                    print '\tNM:i:{}\t'.format(len(sA)-sA.count('|')),
-                    if resPrint[1] > 0:
-                        print 'ZS:i:{}'.format(resPrint[1])
-                    else:
-                        print
-
-
-        ssw.init_destroy(qProfile)
-        if args.bBest and not args.bProtien:
-            ssw.init_destroy(qRcProfile)
+    iQueries = ((nQ, sQId, sQSeq, sQQual) for nQ,(sQId,sQSeq,sQQual) in enumerate(read(args.query)))
+    if args.nProcs > 1:
+# queries are aligned by a pool of processes sharing the encoded targets (mapped, not pickled)
+# imap returns the outputs in query order, so the output is the same as with a single process
+        dTargets = targets.share()
+        try:
+            with mp.Pool(args.nProcs, initializer=init_worker, initargs=(args, dTargets, lScore, lEle, dRc, nFlag)) as pool:
+                for lOut in pool.imap(align_chunk, chunk_queries(iQueries, QUERIES_PER_CHUNK)):
+                    for out in lOut:
+                        write_out(out)
+        finally:
+            targets.close()
+    else:
+        for nQ,sQId,sQSeq,sQQual in iQueries:
+            write_out(align_query(ssw, targets, nQ, sQId, sQSeq, sQQual, args, mat, lEle, sTable, dRc, nFlag))
+    if args.bBinary:
+        hitWriter.close()
+        sys.stdout.buffer.flush()
 
 
 if __name__ == '__main__':
@@ -367,10 +528,16 @@ if __name__ == '__main__':
     parser.add_argument('-p', '--bProtien', action='store_true', help='Do protein sequence alignment. Without this option, the ssw_test will do genome sequence alignment. [default: False]')
     parser.add_argument('-a', '--sMatrix', default='', help='a file for either Blosum or Pam weight matrix. [default: Blosum50]')
     parser.add_argument('-c', '--bPath', action='store_true', help='Return the alignment path. [default: False]')
-    parser.add_argument('-f', '--nThr', default=0, help='a positive integer. Only output the alignments with the Smith-Waterman score >= N.')
+    parser.add_argument('-f', '--nThr', type=int, default=0, help='a positive integer. Only output the alignments with the Smith-Waterman score >= N.')
+    parser.add_argument('-k', '--nTopK', type=int, default=0, help='a positive integer. Only output the N best alignments of each query, best first. [default: 0, all alignments]')
     parser.add_argument('-r', '--bBest', action='store_true', help='The best alignment will be picked between the original read alignment and the reverse complement read alignment. [default: False]')
     parser.add_argument('-s', '--bSam', action='store_true', help='Output in SAM format. [default: no header]')
+    parser.add_argument('-b', '--bBinary', action='store_true', help='Output the hits in the binary format of ssw_hits.py. [default: False]')
     parser.add_argument('-header', '--bHeader', action='store_true', help='If -s is used, include header in SAM output.')
+    parser.add_argument('--symmetric', dest='bSymmetric', action='store_true', help='Target and query are the same file: only align query i against targets j >= i. Cannot be combined with -k. [default: False]')
+    parser.add_argument('--skip-identity', dest='bSkipIdentity', action='store_true', help='With --symmetric, do not align a sequence against itself. [default: False]')
+    parser.add_argument('--deduplicated', dest='bDeduplicated', action='store_true', help='Mark the binary output (-b) as free of mirrored pairs (ex. an off-diagonal partition pair). [default: False]')
+    parser.add_argument('--procs', dest='nProcs', type=int, default=1, help='number of processes aligning queries in parallel. [default: 1]')
     parser.add_argument('target', help='targe file')
     parser.add_argument('query', help='query file')
     if len(sys.argv) == 1:
@@ -381,4 +548,4 @@ if __name__ == '__main__':
     t1 = ti.default_timer()
     main(args)
     t2 = ti.default_timer()
-    print >> sys.stderr, 'CPU time: {} seconds'.format(t2 - t1)
+    print('CPU time: {} seconds'.format(t2 - t1), file=sys.stderr)
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 """
 Simple python wrapper for SSW library
 Please put the path of libssw.so into LD_LIBRARY_PATH or pass it explicitly as a parameter
@@ -101,11 +101,10 @@ class CSsw(object):
         """
 # load libssw
         sLibName = 'libssw.so'
-        if not sLibPath:
-# user doesn't give the path explicitly
+        if sLibPath:
+# user gives the path explicitly
             if not op.exists(op.join(sLibPath, sLibName)):
-                print >> sys.stderr, 'libssw.so does not exist in the input path'
-                sys.exit()
+                raise OSError('libssw.so does not exist in the input path')
             self.ssw = ct.cdll.LoadLibrary(op.join(sLibPath,sLibName))
         else:
 # otherwise just search in PATH
@@ -114,9 +113,9 @@ class CSsw(object):
                 if op.exists(op.join(s,sLibName)):
                     bFound = True
                     self.ssw = ct.cdll.LoadLibrary(op.join(s,sLibName))
+                    break
             if bFound == False:
-                print >> sys.stderr, 'libssw.so does not exist in PATH'
-                sys.exit()
+                raise OSError('libssw.so does not exist in PATH')
 
 # init ssw_init
         """
@@ -203,7 +202,7 @@ def read_matrix(sFile):
     assume the format of the input score matrix is the same as that of http://www.ncbi.nlm.nih.gov/Class/FieldGuide/BLOSUM62.txt
 
     """
-    with open(args.sMatrix, 'r') as f:
+    with open(sFile, 'r') as f:
         for l in f:
             if not l.startswith('#'):
                 break
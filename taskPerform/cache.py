@@ -0,0 +1,82 @@
+"""
+Contains the result cache of a Job: results are stored under a key derived from everything the result depends on
+(the content of the input files, the executable and the arguments), so a task whose key already has a result is satisfied
+by copying that result instead of invoking a Lambda, whichever job, run or task name produced it.
+The cache lives in a bucket of the Job's backend: an S3 bucket with AwsBackend, a local directory with LocalBackend.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+_fileDigests = {} # path - sha256 hex digest of the file's content, so each input file is read once per client
+
+# Returns the sha256 hex digest of the content of the file at path.
+def hashFile(path):
+    if path not in _fileDigests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as input_f:
+            chunk = input_f.read(1 << 20)
+            while chunk:
+                digest.update(chunk)
+                chunk = input_f.read(1 << 20)
+        _fileDigests[path] = digest.hexdigest()
+    return _fileDigests[path]
+
+# Returns the cache key (sha256 hex digest) of a list of strings, ex. file digests (see hashFile) and arguments.
+# The order of the parts matters.
+def createCacheKey(parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = part.encode()
+        digest.update(str(len(encoded)).encode() + b":" + encoded)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Results stored by cache key (see Task's cacheKey attribute) in a bucket of the Job's backend.
+    Results are copied within the backend (S3 server-side copies), never through the client.
+
+    Attributes:
+        bucket: The S3 bucket (or local directory) holding the cached results. Should not be the Job's s3Bucket, so cached
+            results are not mistaken for task results.
+        prefix: Prefix of the cached result keys.
+        workers: Number of threads copying results.
+    """
+    def __init__(self, bucket, prefix="", workers=16):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.workers = workers
+
+    def listKeys(self, backend):
+        """
+        Returns the set of cache keys which have a result.
+        """
+        return set(key[len(self.prefix):] for key in backend.listResults(self.bucket, self.prefix))
+
+    def restore(self, backend, entries, s3Bucket):
+        """
+        Copies the cached results of entries (a list of (cache key, task name)) to the task results in s3Bucket.
+        Returns the list of task names whose result could not be copied.
+        """
+        return self.__copyAll(backend, [(self.bucket, self.prefix + cacheKey, s3Bucket, taskName) for cacheKey, taskName in entries])
+
+    def store(self, backend, entries, s3Bucket):
+        """
+        Copies the results of entries (a list of (cache key, task name)) from s3Bucket into the cache.
+        Returns the list of task names whose result could not be copied.
+        """
+        return self.__copyAll(backend, [(s3Bucket, taskName, self.bucket, self.prefix + cacheKey) for cacheKey, taskName in entries])
+
+    # Copies (sourceBucket, sourceKey, destinationBucket, destinationKey) objects with workers threads. Returns the task names
+    # (the source or destination key in the Job's bucket) of the failed copies.
+    def __copyAll(self, backend, copies):
+        def copy(sourceBucket, sourceKey, destinationBucket, destinationKey):
+            try:
+                backend.copyObject(sourceBucket, sourceKey, destinationBucket, destinationKey)
+                return None
+            except Exception as e:
+                print("Copying " + sourceBucket + "/" + sourceKey + " to " + destinationBucket + "/" + destinationKey + " failed:", repr(e))
+                return sourceKey if destinationBucket == self.bucket else destinationKey
+        if not copies:
+            return []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return [failure for failure in executor.map(lambda entry: copy(*entry), copies) if failure is not None]
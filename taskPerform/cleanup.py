@@ -0,0 +1,45 @@
+"""
+Deletes results (and optionally the completion messages) left by Jobs. The bucket is listed page by page and the results
+are deleted by the backend in requests of up to 1000 keys sent by several threads (see AwsBackend.deleteResults), so a
+bucket of tens of thousands of results is emptied in seconds. Deleting can be limited to a prefix, ex. the results of one
+Job (see Job's resultPrefix), so Jobs sharing a bucket do not delete each other's results. Job.cleanup() does the same for
+the results of a single Job.
+
+Usage (--job <id> is --prefix <id>/; --local uses local directories, see local_backend.py):
+    python3 cleanup.py <s3Bucket> [--prefix <prefix> | --job <id>] [--queue <sqsQueueUrl>] [--local]
+"""
+import sys
+import time
+import getopt
+
+# Returns the result prefix of the Job with the given id (see Job's resultPrefix).
+def getJobPrefix(jobId):
+    return jobId + "/"
+
+# Deletes every result of s3Bucket starting with prefix. Returns the number of deleted results.
+def cleanBucket(backend, s3Bucket, prefix=""):
+    return backend.deleteResults(s3Bucket, backend.listResults(s3Bucket, prefix))
+
+def main():
+    options, args = getopt.gnu_getopt(sys.argv[1:], "", ["prefix=", "job=", "queue=", "local"])
+    options = dict(options)
+    if len(args) != 1 or ("--prefix" in options and "--job" in options):
+        print(__doc__)
+        sys.exit(1)
+    if "--local" in options:
+        import local_backend
+        backend = local_backend.LocalBackend(".")
+    else:
+        import lambda_client
+        backend = lambda_client.AwsBackend()
+    prefix = getJobPrefix(options["--job"]) if "--job" in options else options.get("--prefix", "")
+    startTime = time.time()
+    deleted = cleanBucket(backend, args[0], prefix)
+    print("Deleted " + str(deleted) + " results from [" + args[0] + "]" + (" with prefix [" + prefix + "]" if prefix else "") +
+          " in " + str(round(time.time() - startTime, 2)) + " s")
+    if "--queue" in options:
+        backend.purgeQueue(options["--queue"])
+        print("Purged queue [" + options["--queue"] + "]")
+
+if __name__ == "__main__":
+    main()
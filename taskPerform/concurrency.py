@@ -0,0 +1,95 @@
+"""
+Contains the adaptive concurrency controller of a Job.
+The controller uses AIMD (additive increase, multiplicative decrease): it starts from a conservative limit and raises it
+step by step while the completion rate keeps improving, and cuts it when Lambda throttles invocations or when the
+queue latency (time between a Lambda finishing and the client receiving its message) rises.
+"""
+import threading
+
+class ConcurrencyController:
+    """
+    Decides how many Lambdas a Job runs at a time. The Job reports completions, throttles and the number of running
+    invocations; update() re-evaluates the limit once every window.
+
+    Attributes:
+        limit: The current concurrency limit.
+        minLimit: The limit never goes below this.
+        maxLimit: The limit never goes above this (the Job's concurrencyLimit also applies).
+        increaseStep: Added to the limit after a window in which the completion rate did not drop.
+        decreaseFactor: The limit is multiplied by this after a window with throttles or rising queue latency.
+        window: Length (ms) of the evaluation window.
+        latencyTolerance: Queue latency is considered rising once the window's median exceeds latencyTolerance times the lowest median seen (plus latencySlack ms).
+        history: List of (time in ms, limit), one entry per change of the limit.
+    """
+    def __init__(self, initialLimit=50, minLimit=1, maxLimit=1000, increaseStep=10, decreaseFactor=0.5, window=5000,
+                 latencyTolerance=2.0, latencySlack=1000):
+        self.limit = initialLimit
+        self.minLimit = minLimit
+        self.maxLimit = maxLimit
+        self.increaseStep = increaseStep
+        self.decreaseFactor = decreaseFactor
+        self.window = window
+        self.latencyTolerance = latencyTolerance
+        self.latencySlack = latencySlack
+        self.history = []
+        self.__lock = threading.Lock() # Throttles are reported from the invoker's threads
+        self.__windowStart = None
+        self.__windowCompletions = 0
+        self.__windowLatencies = []
+        self.__windowThrottles = 0
+        self.__previousRate = None
+        self.__baselineLatency = None
+
+    def onCompletion(self, queueLatency):
+        """
+        Reports a completed task and how long (ms) its completion message took to reach the client.
+        """
+        with self.__lock:
+            self.__windowCompletions += 1
+            self.__windowLatencies.append(queueLatency)
+
+    def onThrottle(self):
+        """
+        Reports an invocation rejected because of throttling (TooManyRequestsException).
+        """
+        with self.__lock:
+            self.__windowThrottles += 1
+
+    def __setLimit(self, limit, now):
+        limit = max(self.minLimit, min(self.maxLimit, limit))
+        if limit != self.limit or not self.history:
+            self.limit = limit
+            self.history.append((now, limit))
+
+    def update(self, now, running):
+        """
+        Re-evaluates the limit if a window (ending at now, in ms) has passed. running is the number of invocations in flight.
+        Returns the (possibly changed) limit.
+        """
+        if self.__windowStart is None:
+            self.__windowStart = now
+            self.__setLimit(self.limit, now)
+        if now - self.__windowStart < self.window:
+            return self.limit
+        with self.__lock:
+            completions = self.__windowCompletions
+            latencies = sorted(self.__windowLatencies)
+            throttles = self.__windowThrottles
+            self.__windowCompletions = 0
+            self.__windowLatencies = []
+            self.__windowThrottles = 0
+        rate = completions * 1000.0 / (now - self.__windowStart)
+        self.__windowStart = now
+
+        medianLatency = latencies[len(latencies) // 2] if latencies else None
+        if medianLatency is not None and (self.__baselineLatency is None or medianLatency < self.__baselineLatency):
+            self.__baselineLatency = medianLatency
+        latencyRising = medianLatency is not None and medianLatency > self.latencyTolerance * self.__baselineLatency + self.latencySlack
+
+        if throttles > 0 or latencyRising:
+            self.__setLimit(int(self.limit * self.decreaseFactor), now)
+        elif running >= self.limit and (self.__previousRate is None or rate >= 0.9 * self.__previousRate):
+            # Only grow while the current limit is actually used and the completion rate did not drop.
+            self.__setLimit(self.limit + self.increaseStep, now)
+        self.__previousRate = rate
+        return self.limit
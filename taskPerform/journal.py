@@ -0,0 +1,50 @@
+"""
+Contains the journal of a Job: an append-only local file recording every launch and completion.
+Each line is a JSON object with the time (ms), the event ("launch", "complete", "skip" or "cached") and the task(s) involved.
+Together with the results already in the result store it lets an interrupted Job be resumed (see Job's resume attribute)
+and shows afterwards what happened to every task.
+"""
+import json
+import time
+
+class Journal:
+    """
+    Appends launch and completion records to the file at path. Every record is flushed as soon as it is written,
+    so the journal survives a crash of the client.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.__journalFile = open(path, "a")
+
+    def __write(self, record):
+        record["time"] = int(round(time.time() * 1000))
+        self.__journalFile.write(json.dumps(record) + "\n")
+        self.__journalFile.flush()
+
+    def recordLaunch(self, invocationName, taskNames, attempt):
+        self.__write({"event": "launch", "invocation": invocationName, "tasks": taskNames, "attempt": attempt})
+
+    def recordCompletion(self, taskName, status):
+        self.__write({"event": "complete", "task": taskName, "status": status})
+
+    def recordSkip(self, taskName):
+        self.__write({"event": "skip", "task": taskName})
+
+    def recordCached(self, taskName):
+        self.__write({"event": "cached", "task": taskName})
+
+    def close(self):
+        self.__journalFile.close()
+
+def readJournal(path):
+    """
+    Returns the list of records in the journal at path. A partially written last line (from a crash) is ignored.
+    """
+    records = []
+    with open(path, "r") as journal_f:
+        for line in journal_f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
@@ -0,0 +1,207 @@
+"""
+Contains a local stand-in for AWS Lambda, SQS and S3 which lets a Job run on the local machine.
+Invocations are executed by a process pool which calls handler(event, context) from lambda_function.py directly,
+the completion queue and the result bucket are local directories.
+This is useful for measuring the scheduler (throughput, makespan, client overhead) without AWS and for running small jobs
+locally at full core count.
+
+Usage:
+    job = lambda_client.Job(tasks, concurrencyLimit, "./localQueue", "./localResults", backend=LocalBackend("./lambdaPackage"))
+"""
+import os
+import json
+import uuid
+import time
+import shutil
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from invoker import InvokeStats
+from results import decompressResult, copyResult
+
+class LocalContext:
+    """
+    A minimal stand-in for the context object AWS Lambda passes to the handler.
+    """
+    def __init__(self, functionName):
+        self.function_name = functionName
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 0
+
+    def get_remaining_time_in_millis(self):
+        return 300000
+
+_handlerModule = None # The lambda_function module, loaded once per worker process.
+
+# Runs inside a worker process of the pool. The working directory is set to packageDir since
+# the handler expects to be run from the root of the Lambda package (as /var/task is on Lambda).
+def _runHandler(packageDir, handlerPath, functionName, event):
+    global _handlerModule
+    os.chdir(packageDir)
+    if _handlerModule is None:
+        spec = importlib.util.spec_from_file_location("lambda_function", handlerPath)
+        _handlerModule = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_handlerModule)
+    return _handlerModule.handler(event, LocalContext(functionName))
+
+class LocalBackend:
+    """
+    Executes tasks on the local machine. Implements the same methods as lambda_client.AwsBackend.
+    The sqsQueueUrl and s3Bucket of the Job using this backend are paths of local directories (created if missing).
+
+    Attributes:
+        packageDir: The directory containing the contents of the Lambda package (lambda_function.py, the executable and its data).
+        handlerPath: Path of the file containing handler(event, context). Defaults to packageDir/lambda_function.py.
+        workers: Number of worker processes. Defaults to the number of cores.
+    """
+    def __init__(self, packageDir, handlerPath=None, workers=None):
+        self.packageDir = os.path.abspath(packageDir)
+        self.handlerPath = os.path.abspath(handlerPath) if handlerPath else os.path.join(self.packageDir, "lambda_function.py")
+        self.workers = workers if workers else os.cpu_count()
+        self.__executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.__invokeStats = InvokeStats()
+
+    def invoke(self, functionName, event, onFailed=None):
+        """
+        Queues the event for execution by the process pool. Queuing does not fail, so onFailed is never called.
+        """
+        event = dict(event)
+        event["backend"] = "local"
+        # Workers change their working directory so all paths handed to them need to be absolute.
+        event["sqsQueueUrl"] = os.path.abspath(event["sqsQueueUrl"])
+        event["s3Bucket"] = os.path.abspath(event["s3Bucket"])
+        os.makedirs(event["sqsQueueUrl"], exist_ok=True)
+        os.makedirs(event["s3Bucket"], exist_ok=True)
+        startTime = time.time()
+        future = self.__executor.submit(_runHandler, self.packageDir, self.handlerPath, functionName, event)
+        self.__invokeStats.record(startTime, time.time(), True)
+        future.add_done_callback(self.__reportFailure)
+
+    def __reportFailure(self, future):
+        if future.exception() is not None:
+            print("Local invocation failed:", repr(future.exception()))
+
+    def getInvokeStats(self):
+        """
+        Returns the invoke rate and latency measurements (see invoker.InvokeStats). Latency here is the time to queue an invocation.
+        """
+        return self.__invokeStats.getStats()
+
+    def receiveCompletions(self, queueUrl, waitSeconds=0):
+        """
+        Returns a list of (at most 10) completion messages in the format of SQS's receive_message response.
+        With waitSeconds > 0 the directory is polled until a message is available or waitSeconds have passed.
+        """
+        deadline = time.time() + waitSeconds
+        messages = self.__claimMessages(queueUrl)
+        while not messages and time.time() < deadline:
+            time.sleep(0.05)
+            messages = self.__claimMessages(queueUrl)
+        return messages
+
+    # A message is claimed by moving it to the inflight directory of the queue so it is received only once.
+    def __claimMessages(self, queueUrl):
+        inflightDir = os.path.join(queueUrl, "inflight")
+        os.makedirs(inflightDir, exist_ok=True)
+        messages = []
+        for entry in sorted(os.listdir(queueUrl)):
+            if not entry.endswith(".json"):
+                continue
+            claimedPath = os.path.join(inflightDir, entry)
+            try:
+                os.rename(os.path.join(queueUrl, entry), claimedPath)
+            except FileNotFoundError:
+                continue # Claimed by another receiver
+            with open(claimedPath, "r") as message_f:
+                msg = json.load(message_f)
+            msg["ReceiptHandle"] = claimedPath
+            messages.append(msg)
+            if len(messages) == 10:
+                break
+        return messages
+
+    def deleteCompletions(self, queueUrl, receiptHandles):
+        """
+        Deletes received completion messages.
+        """
+        for receiptHandle in receiptHandles:
+            os.remove(receiptHandle)
+
+    def releaseCompletions(self, queueUrl, receiptHandles):
+        """
+        Puts received but unprocessed completion messages back into the queue.
+        """
+        for receiptHandle in receiptHandles:
+            os.rename(receiptHandle, os.path.join(queueUrl, os.path.basename(receiptHandle)))
+
+    def listResults(self, s3Bucket, prefix=""):
+        """
+        Returns the keys of all result files in the s3Bucket directory starting with prefix.
+        """
+        keys = []
+        for root, dirs, files in os.walk(s3Bucket):
+            for fileName in files:
+                if fileName.endswith(".part"):
+                    continue # Upload in progress
+                key = os.path.relpath(os.path.join(root, fileName), s3Bucket).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return keys
+
+    def readResult(self, s3Bucket, key):
+        """
+        Returns the (uncompressed) content (bytes) of the result file key in the s3Bucket directory.
+        """
+        with open(os.path.join(s3Bucket, key), "rb") as result_f:
+            return decompressResult(result_f.read())
+
+    def openResult(self, s3Bucket, key):
+        """
+        Returns the result file key in the s3Bucket directory opened for reading, as stored (see results.iterateResult for its content).
+        """
+        return open(os.path.join(s3Bucket, key), "rb")
+
+    def downloadResult(self, s3Bucket, key, path):
+        """
+        Copies the result file key in the s3Bucket directory to path, decompressing it on the way.
+        """
+        with open(os.path.join(s3Bucket, key), "rb") as source_f, open(path, "wb") as result_f:
+            copyResult(source_f, result_f)
+
+    def copyObject(self, sourceBucket, sourceKey, destinationBucket, destinationKey):
+        """
+        Copies the file sourceKey of the sourceBucket directory, as stored (compressed), to destinationKey of the destinationBucket directory.
+        """
+        destinationPath = os.path.join(destinationBucket, destinationKey)
+        os.makedirs(os.path.dirname(destinationPath), exist_ok=True)
+        # Copied to a .part file first, like uploads, so a partial copy is never listed.
+        shutil.copyfile(os.path.join(sourceBucket, sourceKey), destinationPath + ".part")
+        os.replace(destinationPath + ".part", destinationPath)
+
+    def deleteResults(self, s3Bucket, keys):
+        """
+        Deletes the result files keys of the s3Bucket directory. Returns the number of deleted files.
+        """
+        deleted = 0
+        for key in keys:
+            try:
+                os.remove(os.path.join(s3Bucket, key))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def purgeQueue(self, queueUrl):
+        """
+        Deletes all messages of the queue directory, including the received ones.
+        """
+        for directory in [queueUrl, os.path.join(queueUrl, "inflight")]:
+            if os.path.isdir(directory):
+                for entry in os.listdir(directory):
+                    if entry.endswith(".json"):
+                        os.remove(os.path.join(directory, entry))
+
+    def shutdown(self):
+        """
+        Waits for all queued invocations and stops the worker processes.
+        """
+        self.__executor.shutdown(wait=True)
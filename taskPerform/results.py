@@ -0,0 +1,47 @@
+"""
+Contains the helpers for reading result objects on the client.
+The handler stores results compressed (see Task's compression attribute); the compression is recognized from the first
+bytes of the object (gzip or zstd magic number), so compressed and uncompressed results can be read the same way.
+zstd compressed results need the zstandard package.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Returns a decompressor (an object with decompress(data)) for result data starting with header,
+# or None if the data is not compressed.
+def createDecompressor(header):
+    if header.startswith(GZIP_MAGIC):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if header.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("The result is zstd compressed; the zstandard package is needed to read it.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return None
+
+# Returns the uncompressed content (bytes) of the result data.
+def decompressResult(data):
+    decompressor = createDecompressor(data[:4])
+    return decompressor.decompress(data) if decompressor else data
+
+# Yields the uncompressed content of the result read from source (a file-like object) in chunks, so a result can be
+# parsed as it is read without holding it in memory or on disk.
+def iterateResult(source, chunkSize=1 << 20):
+    chunk = source.read(chunkSize)
+    decompressor = createDecompressor(chunk[:4])
+    while chunk:
+        data = decompressor.decompress(chunk) if decompressor else chunk
+        if data:
+            yield data
+        chunk = source.read(chunkSize)
+
+# Copies the result read from source (a file-like object) to destination_f (a binary file) in chunks, decompressing it if needed.
+def copyResult(source, destination_f, chunkSize=1 << 20):
+    for data in iterateResult(source, chunkSize):
+        destination_f.write(data)
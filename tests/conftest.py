@@ -0,0 +1,12 @@
+"""
+The modules under test are scripts importing each other by name (ex. "from invoker import Invoker"), as they are deployed,
+so their folders are put on the path instead of being imported as packages.
+"""
+import os
+import sys
+
+repositoryRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repositoryRoot, "examples", "proteinSequenceAlignment", "ssw"))
+sys.path.insert(0, os.path.join(repositoryRoot, "taskPerform"))
+sys.path.append(os.path.join(repositoryRoot, "examples", "proteinSequenceAlignment", "client")) # after taskPerform, whose copies win
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1") # boto3 clients are created (never used) by some constructors
@@ -0,0 +1,99 @@
+"""
+A backend for testing Jobs without AWS or worker processes: every invocation is decided immediately by a script
+(outcome(taskName, attempt) for each task of the invocation) and its completion messages are queued in memory.
+"""
+import queue
+import time
+import threading
+
+class FakeBackend:
+    """
+    Outcomes: "ok" (succeeded), "fail" (the task reports a failure), "fail2" (the failure is reported twice, as by two copies
+    of the invocation), "lost" (no message ever arrives),
+    "reject" or "throttle" (the invocation itself is rejected; applies to the whole invocation).
+
+    Attributes:
+        invocations: The (functionName, event) of every invocation, in order.
+        attempts: task name - number of invocations which included the task.
+        results: The keys listed as existing results.
+        buckets: bucket - keys listed in the other buckets (ex. a ResultCache's bucket).
+        copies: The (sourceBucket, sourceKey, destinationBucket, destinationKey) of every copyObject, in order.
+    """
+    def __init__(self, outcome, results=(), buckets=None):
+        self.outcome = outcome
+        self.results = list(results)
+        self.buckets = dict((bucket, list(keys)) for bucket, keys in (buckets or {}).items())
+        self.copies = []
+        self.invocations = []
+        self.attempts = {}
+        self.__messages = queue.Queue()
+        self.__lock = threading.Lock()
+
+    def invoke(self, functionName, event, onFailed=None):
+        with self.__lock:
+            self.invocations.append((functionName, event))
+            tasks = event["tasks"] if "tasks" in event else [event]
+            outcomes = []
+            for task in tasks:
+                self.attempts[task["taskName"]] = self.attempts.get(task["taskName"], 0) + 1
+                outcomes.append(self.outcome(task["taskName"], self.attempts[task["taskName"]]))
+        rejections = [outcome for outcome in outcomes if outcome in ("reject", "throttle")]
+        if rejections:
+            if onFailed:
+                onFailed(RuntimeError("Rejected " + functionName), rejections[0] == "throttle")
+            return
+        for task, outcome in zip(tasks, outcomes):
+            if outcome in ("ok", "fail"):
+                self.send(task["taskName"], outcome, event.get("attemptId"))
+            elif outcome == "fail2":
+                self.send(task["taskName"], "fail", event.get("attemptId"))
+                self.send(task["taskName"], "fail", event.get("attemptId"))
+
+    # Queues the completion message ("ok" or "fail") of the task, as the handler of attempt attemptId would.
+    def send(self, taskName, outcome, attemptId):
+        now = int(round(time.time() * 1000))
+        attributes = {"TaskName": {"StringValue": taskName}, "StartTime": {"StringValue": str(now - 5)},
+                      "EndTime": {"StringValue": str(now)}}
+        if attemptId is not None:
+            attributes["Attempt"] = {"StringValue": attemptId}
+        if outcome == "fail":
+            attributes["Status"] = {"StringValue": "Failed"}
+            body = "Task " + taskName + " failed: scripted failure"
+        else:
+            attributes["Status"] = {"StringValue": "Succeeded"}
+            body = "Task " + taskName + " took a total of 0.005 seconds to complete."
+        self.__messages.put({"MessageAttributes": attributes, "Body": body, "ReceiptHandle": taskName + "/" + str(now)})
+
+    def receiveCompletions(self, queueUrl, waitSeconds=0):
+        messages = []
+        try:
+            messages.append(self.__messages.get(timeout=min(waitSeconds, 0.05)) if waitSeconds else self.__messages.get_nowait())
+            while len(messages) < 10:
+                messages.append(self.__messages.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    def deleteCompletions(self, queueUrl, receiptHandles):
+        pass
+
+    def releaseCompletions(self, queueUrl, receiptHandles):
+        pass
+
+    def listResults(self, s3Bucket, prefix=""):
+        return [key for key in self.buckets.get(s3Bucket, self.results) if key.startswith(prefix)]
+
+    def copyObject(self, sourceBucket, sourceKey, destinationBucket, destinationKey):
+        with self.__lock:
+            self.copies.append((sourceBucket, sourceKey, destinationBucket, destinationKey))
+            self.buckets.get(destinationBucket, self.results).append(destinationKey)
+
+    def getInvokeStats(self):
+        return {}
+
+# Runs job.executeAllTasks() in a thread and returns whether it finished within timeout seconds (a hung Job does not).
+def runJob(job, timeout=20):
+    thread = threading.Thread(target=job.executeAllTasks, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
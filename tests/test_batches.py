@@ -0,0 +1,35 @@
+import pytest
+import lambda_client as lc
+
+def createTask(name, cost):
+    return lc.Task(["run", name], name, "executable", "function", cost=cost)
+
+def describe(units):
+    return sorted(sorted(task.name for task in unit.getSubtasks()) for unit in units)
+
+def test_tasks_are_packed_first_fit_decreasing():
+    tasks = [createTask(str(cost), cost) for cost in [6, 5, 4, 3, 2, 1]]
+    units = lc.createBatches(tasks, targetDuration=10, costPerMs=1)
+    assert describe(units) == [["1"], ["2", "3", "5"], ["4", "6"]]
+    assert sum(1 for unit in units if isinstance(unit, lc.TaskBatch)) == 2
+
+def test_long_tasks_and_tasks_without_cost_are_not_batched():
+    tasks = [createTask("long", 10), createTask("unknown", None), createTask("a", 1), createTask("b", 1)]
+    assert describe(lc.createBatches(tasks, targetDuration=10, costPerMs=1)) == [["a", "b"], ["long"], ["unknown"]]
+
+def test_batches_hold_at_most_max_batch_size_tasks():
+    tasks = [createTask(str(i), 1) for i in range(5)]
+    units = lc.createBatches(tasks, targetDuration=100, costPerMs=1, maxBatchSize=2)
+    assert sorted(len(unit.getSubtasks()) for unit in units) == [1, 2, 2]
+
+def test_batch_payload_lists_the_tasks_to_run():
+    batch = lc.TaskBatch([createTask("a", 1), createTask("b", 2)])
+    assert batch.cost == 3
+    payload = batch.getPayload("queue", "bucket", "job/")
+    assert [(task["taskName"], task["resultKey"], task["command"]) for task in payload["tasks"]] == [("a", "job/a", ["run", "a"]), ("b", "job/b", ["run", "b"])]
+    assert (payload["sqsQueueUrl"], payload["s3Bucket"]) == ("queue", "bucket")
+    assert [task["taskName"] for task in batch.getPayload("queue", "bucket", tasks=batch.tasks[1:])["tasks"]] == ["b"]
+
+def test_empty_batch_is_rejected():
+    with pytest.raises(ValueError):
+        lc.TaskBatch([])
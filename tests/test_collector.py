@@ -0,0 +1,43 @@
+import threading
+import time
+from collector import CompletionCollector
+
+class QueueBackend:
+    """
+    Returns the scripted batches of messages of successive receive calls (then nothing) and records deletes and releases.
+    """
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.deleted = []
+        self.released = []
+        self.__lock = threading.Lock()
+        self.__received = threading.Event()
+
+    def receiveCompletions(self, queueUrl, waitSeconds=0):
+        with self.__lock:
+            batch = self.batches.pop(0) if self.batches else None
+        if batch is None:
+            self.__received.set()
+            time.sleep(0.01)
+            return []
+        return [{"ReceiptHandle": receiptHandle} for receiptHandle in batch]
+
+    def deleteCompletions(self, queueUrl, receiptHandles):
+        self.deleted.extend(receiptHandles)
+
+    def releaseCompletions(self, queueUrl, receiptHandles):
+        self.released.extend(receiptHandles)
+
+    def waitUntilReceived(self):
+        self.__received.wait(5)
+
+def test_stop_releases_the_messages_not_taken():
+    backend = QueueBackend([["a", "b", "c"], ["d"]])
+    collector = CompletionCollector(backend, "queue", waitSeconds=0)
+    collector.start()
+    backend.waitUntilReceived()
+    msg = collector.getMessage(timeout=1)
+    collector.acknowledge(msg["ReceiptHandle"])
+    collector.stop()
+    assert backend.deleted == ["a"]
+    assert sorted(backend.released) == ["b", "c", "d"]
@@ -0,0 +1,56 @@
+from botocore.exceptions import ClientError, EndpointConnectionError
+from invoker import Invoker, isThrottle, isTransient
+
+def clientError(code, status):
+    return ClientError({"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "Invoke")
+
+class ScriptedLambdaClient:
+    """
+    Raises the scripted errors (None for a successful call) of successive invoke calls.
+    """
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, **kwargs):
+        self.calls += 1
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+
+def invoke(errors, transientAttempts=3):
+    invoker = Invoker(workers=1, transientAttempts=transientAttempts)
+    client = ScriptedLambdaClient(errors)
+    invoker._Invoker__lambdaClient = client
+    failures = []
+    invoker.invoke("function", {}, lambda error, throttled: failures.append((error, throttled)))
+    invoker.shutdown()
+    return client.calls, failures
+
+def test_error_classification():
+    assert isThrottle(clientError("TooManyRequestsException", 429))
+    assert not isThrottle(clientError("AccessDeniedException", 403))
+    assert isTransient(clientError("ServiceException", 500))
+    assert isTransient(EndpointConnectionError(endpoint_url="https://lambda"))
+    assert not isTransient(clientError("ResourceNotFoundException", 404))
+    assert not isTransient(clientError("TooManyRequestsException", 429))
+
+def test_transient_errors_are_retried():
+    calls, failures = invoke([clientError("ServiceException", 500), EndpointConnectionError(endpoint_url="https://lambda")])
+    assert calls == 3
+    assert failures == []
+
+def test_transient_errors_are_reported_after_the_last_attempt():
+    calls, failures = invoke([clientError("ServiceException", 503)] * 3)
+    assert calls == 3
+    assert len(failures) == 1 and failures[0][1] is False
+
+def test_throttles_are_reported_without_retrying():
+    calls, failures = invoke([clientError("TooManyRequestsException", 429)])
+    assert calls == 1
+    assert len(failures) == 1 and failures[0][1] is True
+
+def test_permanent_errors_are_reported_without_retrying():
+    calls, failures = invoke([clientError("AccessDeniedException", 403)])
+    assert calls == 1
+    assert len(failures) == 1 and failures[0][1] is False
@@ -0,0 +1,176 @@
+import time
+import lambda_client as lc
+from fake_backend import FakeBackend, runJob
+from journal import Journal
+from cache import ResultCache
+
+def createTask(name, cost=1, cacheKey=None):
+    return lc.Task(["run", name], name, "executable", "function", cost=cost, cacheKey=cacheKey)
+
+def createJob(tasks, backend, **options):
+    return lc.Job(set(tasks), 4, "queue", "bucket", backend=backend, **options)
+
+def test_all_tasks_succeed():
+    backend = FakeBackend(lambda taskName, attempt: "ok")
+    job = createJob([createTask(str(i)) for i in range(10)], backend)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert len(backend.invocations) == 10
+
+def test_failed_task_is_retried():
+    backend = FakeBackend(lambda taskName, attempt: "fail" if attempt == 1 else "ok")
+    job = createJob([createTask("a")], backend)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 2}
+
+def test_task_fails_after_max_attempts():
+    backend = FakeBackend(lambda taskName, attempt: "fail")
+    job = createJob([createTask("a")], backend, maxAttempts=3)
+    assert runJob(job)
+    assert backend.attempts == {"a": 3}
+    assert job.getFailedTasks() == {"a": "Task a failed: scripted failure"}
+
+def test_lost_task_is_relaunched_after_timeout():
+    backend = FakeBackend(lambda taskName, attempt: "lost" if attempt == 1 else "ok")
+    job = createJob([createTask("a")], backend, taskTimeout=100)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 2}
+
+def test_failed_subtask_of_batch_is_relaunched_alone():
+    backend = FakeBackend(lambda taskName, attempt: "fail" if taskName == "b" and attempt == 1 else "ok")
+    batch = lc.TaskBatch([createTask("a"), createTask("b"), createTask("c")])
+    job = createJob([batch], backend)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 1, "b": 2, "c": 1}
+    assert "tasks" not in backend.invocations[1][1] and backend.invocations[1][1]["taskName"] == "b"
+
+def test_relaunched_batch_omits_its_completed_tasks():
+    backend = FakeBackend(lambda taskName, attempt: "lost" if taskName != "a" and attempt == 1 else "ok")
+    batch = lc.TaskBatch([createTask("a"), createTask("b"), createTask("c")])
+    job = createJob([batch], backend, taskTimeout=100)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 1, "b": 2, "c": 2}
+    assert [task["taskName"] for task in backend.invocations[1][1]["tasks"]] == ["b", "c"]
+
+def test_failing_subtask_of_batch_fails_alone():
+    backend = FakeBackend(lambda taskName, attempt: "fail" if taskName == "b" else "ok")
+    batch = lc.TaskBatch([createTask("a"), createTask("b"), createTask("c")])
+    job = createJob([batch, createTask("d")], backend, maxAttempts=2)
+    assert runJob(job)
+    assert set(job.getFailedTasks()) == {"b"}
+    assert backend.attempts == {"a": 1, "b": 2, "c": 1, "d": 1}
+
+def test_rejected_invocation_fails_after_max_attempts():
+    backend = FakeBackend(lambda taskName, attempt: "reject")
+    job = createJob([createTask("a"), createTask("b")], backend, maxAttempts=3, throttleBackoff=10)
+    assert runJob(job)
+    assert backend.attempts == {"a": 3, "b": 3}
+    assert set(job.getFailedTasks()) == {"a", "b"}
+    assert job.getFailedTasks()["a"].startswith("Task a could not be invoked after 3 attempts")
+
+def test_rejected_invocation_is_retried():
+    backend = FakeBackend(lambda taskName, attempt: "reject" if attempt == 1 else "ok")
+    job = createJob([createTask("a")], backend, throttleBackoff=10)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 2}
+
+def test_throttled_invocations_do_not_count_against_max_attempts():
+    backend = FakeBackend(lambda taskName, attempt: "throttle" if attempt <= 3 else "ok")
+    job = createJob([createTask("a"), createTask("b")], backend, maxAttempts=1, throttleBackoff=10)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 4, "b": 4}
+
+def test_rejected_batch_fails_all_its_tasks():
+    backend = FakeBackend(lambda taskName, attempt: "reject")
+    job = createJob([lc.TaskBatch([createTask("a"), createTask("b")])], backend, maxAttempts=2, throttleBackoff=10)
+    assert runJob(job)
+    assert set(job.getFailedTasks()) == {"a", "b"}
+
+def test_stale_failure_of_batch_does_not_end_detached_attempt():
+    backend = FakeBackend(lambda taskName, attempt: "fail2" if taskName == "b" and attempt == 1 else "ok")
+    batch = lc.TaskBatch([createTask("a"), createTask("b")])
+    job = createJob([batch], backend)
+    assert runJob(job)
+    assert job.getFailedTasks() == {}
+    assert backend.attempts == {"a": 1, "b": 2}
+
+class LateFailureBackend(FakeBackend):
+    """
+    Rejects the second attempt of task "slow" (a speculative copy, its first attempt straggles) and delivers the failure of
+    the first attempt a little later, once the rejection has been handled.
+    """
+    def __init__(self):
+        FakeBackend.__init__(self, lambda taskName, attempt: "ok" if taskName != "slow" else ["lost", "reject"][attempt - 1])
+        self.firstAttemptId = None
+        self.lateFailureTime = None
+
+    def invoke(self, functionName, event, onFailed=None):
+        if event.get("taskName") == "slow" and self.firstAttemptId is None:
+            self.firstAttemptId = event["attemptId"]
+        elif event.get("taskName") == "slow" and self.lateFailureTime is None:
+            self.lateFailureTime = time.time() + 0.3
+        FakeBackend.invoke(self, functionName, event, onFailed)
+
+    def receiveCompletions(self, queueUrl, waitSeconds=0):
+        if self.lateFailureTime is not None and time.time() >= self.lateFailureTime:
+            self.lateFailureTime = float("inf")
+            self.send("slow", "fail", self.firstAttemptId)
+        return FakeBackend.receiveCompletions(self, queueUrl, waitSeconds)
+
+def test_rejected_speculative_copy_does_not_end_the_original_attempt():
+    # Without attempts left, a task whose failure report is dropped would only fail at its deadline (taskTimeout).
+    backend = LateFailureBackend()
+    job = createJob([createTask("fast"), createTask("slow")], backend, maxAttempts=2, speculationMinimum=50, throttleBackoff=10)
+    assert runJob(job)
+    assert job.getFailedTasks() == {"slow": "Task slow failed: scripted failure"}
+    assert backend.attempts == {"fast": 1, "slow": 2}
+
+def test_resume_skips_the_tasks_completed_in_the_journal(tmp_path):
+    journalPath = str(tmp_path / "journal.jsonl")
+    journal = Journal(journalPath)
+    journal.recordCompletion("a", "Succeeded")
+    journal.recordCompletion("b", "Succeeded")
+    journal.recordCompletion("c", "Failed")
+    journal.close()
+    # b's result is gone and c failed according to the journal (its result object is left over): both run again.
+    backend = FakeBackend(lambda taskName, attempt: "ok", results=["a", "c"])
+    job = createJob([createTask(name) for name in "abcd"], backend, journalPath=journalPath, resume=True)
+    assert runJob(job)
+    assert job.getSkippedTasks() == {"a"}
+    assert backend.attempts == {"b": 1, "c": 1, "d": 1}
+
+def test_resume_without_journal_skips_existing_results():
+    backend = FakeBackend(lambda taskName, attempt: "ok", results=["a", "c"])
+    job = createJob([createTask(name) for name in "abcd"], backend, resume=True)
+    assert runJob(job)
+    assert job.getSkippedTasks() == {"a", "c"}
+    assert backend.attempts == {"b": 1, "d": 1}
+
+def test_cached_task_is_not_launched_and_new_results_are_cached():
+    backend = FakeBackend(lambda taskName, attempt: "ok", buckets={"cache": ["ssw/ka"]})
+    job = createJob([createTask("a", cacheKey="ka"), createTask("b", cacheKey="kb")], backend, cache=ResultCache("cache", "ssw/"))
+    assert runJob(job)
+    assert backend.attempts == {"b": 1}
+    assert job.getCachedTasks() == {"a"}
+    assert backend.copies == [("cache", "ssw/ka", "bucket", "a"), ("bucket", "b", "cache", "ssw/kb")]
+
+def test_batch_runs_only_its_tasks_missing_from_the_cache():
+    backend = FakeBackend(lambda taskName, attempt: "ok", buckets={"cache": ["ka"]})
+    batch = lc.TaskBatch([createTask("a", cacheKey="ka"), createTask("b", cacheKey="kb")])
+    job = createJob([batch], backend, cache=ResultCache("cache"))
+    assert runJob(job)
+    assert [task["taskName"] for task in backend.invocations[0][1]["tasks"]] == ["b"]
+    assert backend.attempts == {"b": 1}
+
+def test_failed_results_are_not_cached():
+    backend = FakeBackend(lambda taskName, attempt: "fail" if taskName == "b" else "ok", buckets={"cache": []})
+    job = createJob([createTask("a", cacheKey="ka"), createTask("b", cacheKey="kb")], backend, maxAttempts=1, cache=ResultCache("cache"))
+    assert runJob(job)
+    assert set(job.getFailedTasks()) == {"b"}
+    assert backend.copies == [("bucket", "a", "cache", "ka")]
@@ -0,0 +1,30 @@
+import json
+import os
+import lambda_function
+
+# Entry point of the test tasks (see Task's entryPoint): writes its arguments, or fails if the first one is "fail".
+def writeArguments(args, output_f):
+    if args[0] == "fail":
+        raise RuntimeError("scripted failure")
+    output_f.write(" ".join(args).encode())
+
+def readMessages(queueDir):
+    messages = []
+    for fileName in os.listdir(queueDir):
+        with open(os.path.join(queueDir, fileName)) as message_f:
+            messages.append(json.load(message_f))
+    return {message["MessageAttributes"]["TaskName"]["StringValue"]: message["MessageAttributes"] for message in messages}
+
+def test_each_task_of_a_batch_stores_and_reports_its_own_result(tmp_path):
+    resultsDir, queueDir = tmp_path / "results", tmp_path / "queue"
+    queueDir.mkdir()
+    tasks = [{"taskName": name, "resultKey": "job/" + name, "command": command, "entryPoint": "test_lambda_function:writeArguments", "compression": "none"}
+             for name, command in [("a", ["first", "task"]), ("b", ["fail"]), ("c", ["third"])]]
+    event = {"tasks": tasks, "sqsQueueUrl": str(queueDir), "s3Bucket": str(resultsDir), "backend": "local", "attemptId": "batch-a#1"}
+    lambda_function.handler(event, None)
+    assert (resultsDir / "job" / "a").read_bytes() == b"first task"
+    assert (resultsDir / "job" / "c").read_bytes() == b"third"
+    assert not (resultsDir / "job" / "b").exists()
+    messages = readMessages(str(queueDir))
+    assert {name: attributes["Status"]["StringValue"] for name, attributes in messages.items()} == {"a": "Succeeded", "b": "Failed", "c": "Succeeded"}
+    assert all(attributes["Attempt"]["StringValue"] == "batch-a#1" for attributes in messages.values())
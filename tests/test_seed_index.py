@@ -0,0 +1,38 @@
+import random
+import pytest
+
+numpy = pytest.importorskip("numpy")
+import ssw_engine
+
+AMINO_ACIDS = "ARNDCQEGHILKMFPSTWYV"
+
+def createIndex(sequences, **options):
+    table, _, _ = ssw_engine.createScoring(True, None, 2, 2)
+    records = [("target" + str(i), sequence) for i, sequence in enumerate(sequences)]
+    targets = ssw_engine.TargetStore(records, lambda sequence: ssw_engine.encodeSequence(sequence, table))
+    return ssw_engine.SeedIndex(targets, ssw_engine.createReduction(table), **options), table
+
+def randomProtein(generator, length):
+    return "".join(generator.choice(AMINO_ACIDS) for _ in range(length)).encode()
+
+def mutate(generator, sequence, rate):
+    return bytes(generator.choice(AMINO_ACIDS.encode()) if generator.random() < rate else residue for residue in sequence)
+
+def test_homolog_is_a_candidate_and_unrelated_query_is_not():
+    generator = random.Random(7)
+    sequences = [randomProtein(generator, generator.randint(100, 800)) for _ in range(40)]
+    index, table = createIndex(sequences)
+    homolog = mutate(generator, sequences[12][30:250], 0.2)
+    assert index.findCandidates(ssw_engine.encodeSequence(homolog, table)) == [12]
+    unrelated = randomProtein(generator, 600)
+    assert index.findCandidates(ssw_engine.encodeSequence(unrelated, table)) == []
+
+def test_query_shorter_than_the_seed_has_no_candidates():
+    generator = random.Random(3)
+    index, table = createIndex([randomProtein(generator, 200) for _ in range(5)])
+    assert index.findCandidates(ssw_engine.encodeSequence(b"ARN", table)) == []
+
+@pytest.mark.parametrize("options", [{"seedPattern": "011"}, {"seedPattern": "1" * 9}, {"diagonalBand": 6}, {"maxEvalue": 0}])
+def test_invalid_options_are_rejected(options):
+    with pytest.raises(ValueError):
+        createIndex([b"ARNDCQEGHILK"], **options)
@@ -0,0 +1,62 @@
+import io
+import os
+import re
+import pytest
+import ssw_engine
+import ssw_hits
+
+RECORDS = [("seq" + str(i), b"ACDEFGHIKLMNPQRSTVWY"[i:] * 3) for i in range(5)]
+
+requiresLibrary = pytest.mark.skipif(not os.path.exists(os.path.join(os.path.dirname(os.path.abspath(ssw_engine.__file__)), "libssw.so")),
+                                     reason="libssw.so is not built (see the Makefile in ssw/)")
+
+@pytest.fixture(params=[False, True], ids=["parsed", "indexed"])
+def fastaPath(request, tmp_path):
+    path = tmp_path / "records.fasta"
+    lines = [line for name, sequence in RECORDS for line in [b">" + name.encode()] + [sequence[i:i + 25] for i in range(0, len(sequence), 25)]]
+    path.write_bytes(b"\n".join(lines) + b"\n")
+    if request.param:
+        ssw_engine.buildIndex(str(path))
+    return str(path)
+
+def test_record_range_is_read(fastaPath):
+    assert list(ssw_engine.readInput(fastaPath + ":2-4")) == RECORDS[1:4]
+    assert list(ssw_engine.readInput(fastaPath + ":5-5")) == RECORDS[4:]
+
+@pytest.mark.parametrize("recordRange", ["3-6", "6-8"])
+def test_record_range_beyond_the_last_record_is_rejected(fastaPath, recordRange):
+    with pytest.raises(ValueError):
+        list(ssw_engine.readInput(fastaPath + ":" + recordRange))
+
+def test_reversed_record_range_is_rejected(fastaPath):
+    with pytest.raises(ValueError):
+        ssw_engine.readInput(fastaPath + ":4-2")
+
+def test_record_range_of_a_package_is_checked(tmp_path):
+    path = str(tmp_path / "records.sswp")
+    ssw_engine.writePackage(RECORDS, ssw_engine.AA_ELEMENTS, path)
+    table, _, _ = ssw_engine.createScoring(True, None, 2, 2)
+    assert ssw_engine.loadTargets(path + ":2-3", table).names == ["seq1", "seq2"]
+    with pytest.raises(ValueError):
+        ssw_engine.loadTargets(path + ":2-6", table)
+
+@requiresLibrary
+@pytest.mark.parametrize("path", [False, True], ids=["scores", "cigars"])
+def test_binary_hits_match_the_text_scores(fastaPath, tmp_path, path):
+    text_f = io.BytesIO()
+    ssw_engine.alignFiles(fastaPath, fastaPath, text_f, scoreOnly=True)
+    hitsPath = str(tmp_path / "hits.bin")
+    with open(hitsPath, "wb") as hits_f:
+        assert ssw_engine.alignFiles(fastaPath, fastaPath, hits_f, binary=True, path=path) == len(RECORDS) ** 2
+    hits = ssw_hits.HitFile(hitsPath)
+    assert hits.hasCigar == path
+    assert [(int(record["query"]), int(record["target"])) for record in hits.records] == [(query, target) for query in range(len(RECORDS)) for target in range(len(RECORDS))]
+    assert hits.records["score"].tolist() == [int(score) for score in re.findall(rb"\d+", text_f.getvalue())]
+    if path:
+        # Each sequence against itself aligns without gaps.
+        for i, (name, sequence) in enumerate(RECORDS):
+            assert hits.getCigar(i * len(RECORDS) + i) == str(len(sequence)) + "M"
+
+def test_cigars_need_binary_output(fastaPath):
+    with pytest.raises(ValueError):
+        ssw_engine.alignFiles(fastaPath, fastaPath, io.BytesIO(), path=True)
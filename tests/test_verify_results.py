@@ -0,0 +1,45 @@
+import io
+import os
+import pytest
+import ssw_engine
+from ssw_hits import HitWriter, HitFile
+from verify_results import parseHits
+
+def writeHits(hits, withCigar):
+    output_f = io.BytesIO()
+    writer = HitWriter(output_f, withCigar=withCigar)
+    for query, target, cigar in hits:
+        writer.writeHit(query, target, 10 + target, 0, 1, 20, 2, 21, cigar=cigar)
+    writer.close()
+    return output_f.getvalue()
+
+def inChunks(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+@pytest.mark.parametrize("withCigar", [False, True])
+@pytest.mark.parametrize("chunkSize", [1, 7, 64, 1 << 20])
+def test_hits_are_parsed_from_chunks(withCigar, chunkSize):
+    hits = [(query, target, [(target + 1) << 4, 3 << 4 | 1] * (query + 1)) for query in range(5) for target in range(7)]
+    parsed = list(parseHits(inChunks(writeHits(hits, withCigar), chunkSize)))
+    assert [pair for pair, values in parsed] == [(query, target) for query, target, _ in hits]
+    assert parsed[3][1] == (13, 0, 1, 20, 2, 21, 0)
+
+def test_truncated_hits_are_rejected():
+    data = writeHits([(0, 0, None), (0, 1, None)], False)
+    with pytest.raises(ValueError):
+        list(parseHits(inChunks(data[:-5], 16)))
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(os.path.dirname(os.path.abspath(ssw_engine.__file__)), "libssw.so")),
+                    reason="libssw.so is not built (see the Makefile in ssw/)")
+@pytest.mark.parametrize("path", [False, True])
+def test_engine_hits_are_parsed_like_the_hit_file(tmp_path, path):
+    fastaPath = tmp_path / "records.fasta"
+    fastaPath.write_bytes(b"".join(b">seq" + str(i).encode() + b"\n" + b"MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ"[i:] + b"\n" for i in range(6)))
+    hitsPath = str(tmp_path / "hits.bin")
+    with open(hitsPath, "wb") as hits_f:
+        ssw_engine.alignFiles(str(fastaPath), str(fastaPath), hits_f, binary=True, path=path)
+    with open(hitsPath, "rb") as hits_f:
+        parsed = list(parseHits(inChunks(hits_f.read(), 100)))
+    records = HitFile(hitsPath).records
+    assert [pair for pair, values in parsed] == list(zip(records["query"].tolist(), records["target"].tolist()))
+    assert [values[0] for pair, values in parsed] == records["score"].tolist()